@@ -0,0 +1,2 @@
+class AnalysisBusyException(Exception):
+    pass
\ No newline at end of file
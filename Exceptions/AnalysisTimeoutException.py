@@ -0,0 +1,2 @@
+class AnalysisTimeoutException(Exception):
+    pass
\ No newline at end of file
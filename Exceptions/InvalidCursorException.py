@@ -0,0 +1,2 @@
+class InvalidCursorException(Exception):
+    pass
\ No newline at end of file
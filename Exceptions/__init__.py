@@ -1,3 +1,6 @@
 from .IDLikeColumnException import IDLikeColumnException
 from .ParseColException import ParseColException
-from .SummeriseColException import SummeriseColException
\ No newline at end of file
+from .SummeriseColException import SummeriseColException
+from .AnalysisBusyException import AnalysisBusyException
+from .AnalysisTimeoutException import AnalysisTimeoutException
+from .InvalidCursorException import InvalidCursorException
\ No newline at end of file
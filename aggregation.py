@@ -0,0 +1,170 @@
+import os
+import numpy as np
+import pandas as pd
+from pymongo.errors import OperationFailure
+from dotenv import load_dotenv
+from mongo import get_collection
+from helpers import round_float
+from metrics import timed
+
+
+load_dotenv()
+
+CHART_EXECUTION = os.getenv("CHART_EXECUTION", "pandas")
+
+NUMERIC_STATISTICS = ['count', 'std', 'var', 'median', 'min', 'max', 'mean']
+
+# 'number' also matches Decimal128, which pd.cut can not bin; those columns take the pandas path
+NUMERIC_TYPES = ['double', 'int', 'long']
+
+def use_pushdown(execution, statistic):
+    # $median is approximate: a median chart is computed exactly in pandas
+    execution = execution or CHART_EXECUTION
+    return execution == 'mongo' and statistic not in ['density', 'median']
+
+@timed('pushdown')
+async def aggregate_bins_in_mongo(dataset, independent_variable, category_variable=None):
+    """Bin and aggregate a numeric column inside MongoDB.
+
+    Returns ``{'d_type', 'overall_statitis', 'groups', 'x_axis', 'exact'}``
+    shaped like the pandas path of ``histogram``/``bar``, with ``exact`` flagging
+    the approximate ``$median``, or ``None`` when the column type can not be
+    decided from BSON types alone (strings, dates, booleans, Decimal128, NaN,
+    <= 10 distinct values) or the server lacks ``$median``.
+    """
+    collection = get_collection()
+    field = f'$data.{independent_variable}'
+    match = {'dataset_id': {'$eq': int(dataset)}}
+
+    probe = await _probe_numeric_column(collection, match, independent_variable)
+    if probe is None:
+        return None
+
+    match[f'data.{independent_variable}'] = {'$type': NUMERIC_TYPES}
+    if category_variable is not None:
+        match[f'data.{category_variable}'] = {'$ne': None}
+
+    try:
+        overall = await collection.aggregate([
+            {'$match': match},
+            {'$group': {'_id': None, **_numeric_accumulators(field)}},
+        ]).to_list(None)
+        if not overall:
+            return None
+        overall = overall[0]
+
+        edges, intervals = cut_edges(overall['min'], overall['max'])
+        group_id = {'bin': _bin_expression(field, edges)}
+        if category_variable is not None:
+            group_id['category'] = f'$data.{category_variable}'
+
+        cells = await collection.aggregate([
+            {'$match': match},
+            {'$group': {'_id': group_id, **_numeric_accumulators(field)}},
+        ]).to_list(None)
+    except OperationFailure:
+        return None
+
+    rows = []
+    for cell in cells:
+        row = {'$$bins': intervals[cell['_id']['bin']]}
+        if category_variable is not None:
+            row['$$category_variable'] = cell['_id']['category']
+        row.update(_numeric_statistics(cell))
+        rows.append(row)
+
+    group_columns = ['$$bins', '$$category_variable'] if category_variable is not None else ['$$bins']
+    groups = pd.DataFrame(rows, columns=group_columns + NUMERIC_STATISTICS)
+    x_axis = sorted(set(groups['$$bins']))
+
+    # match groupby(observed=False): every bin, with empty cells counted as 0
+    if category_variable is not None:
+        grid = pd.MultiIndex.from_product([intervals, groups['$$category_variable'].unique()], names=group_columns)
+    else:
+        grid = pd.Index(intervals, name='$$bins')
+    groups = groups.set_index(group_columns).reindex(grid).reset_index()
+    groups['count'] = groups['count'].fillna(0).astype(int)
+
+    overall_statitis = _numeric_statistics(overall)
+    for key, value in overall_statitis.items():
+        overall_statitis[key] = round_float(value)
+
+    return {
+        'd_type': 'numeric',
+        'overall_statitis': overall_statitis,
+        'groups': groups,
+        'x_axis': x_axis,
+        'exact': {**{statistic: True for statistic in NUMERIC_STATISTICS}, 'median': False},
+    }
+
+def cut_edges(minimum, maximum):
+    # the edges pd.cut(values, bins=10) bins a column spanning minimum..maximum
+    # with, and the intervals it labels the bins with: the edges rounded to its precision
+    binned, edges = pd.cut(pd.Series([minimum, maximum]), bins=10, retbins=True)
+    return edges, binned.cat.categories
+
+async def _probe_numeric_column(collection, match, column):
+    field = f'$data.{column}'
+    summary = await collection.aggregate([
+        {'$match': match},
+        {'$group': {
+            '_id': None,
+            'numeric': {'$sum': {'$cond': [{'$in': [{'$type': field}, NUMERIC_TYPES]}, 1, 0]}},
+            'missing': {'$sum': {'$cond': [{'$eq': [{'$ifNull': [field, None]}, None]}, 1, 0]}},
+            'nan': {'$sum': {'$cond': [{'$eq': [field, float('nan')]}, 1, 0]}},
+            'rows': {'$sum': 1},
+        }},
+    ]).to_list(None)
+    if not summary:
+        return None
+    summary = summary[0]
+
+    if summary['nan'] or summary['numeric'] + summary['missing'] != summary['rows']:
+        return None
+
+    denominator = summary['missing'] if summary['missing'] > 0 else 1
+    if summary['numeric'] / denominator <= 0.1:
+        return None
+
+    distinct = await collection.aggregate([
+        {'$match': {**match, f'data.{column}': {'$type': NUMERIC_TYPES}}},
+        {'$group': {'_id': field}},
+        {'$limit': 11},
+    ]).to_list(None)
+    if len(distinct) <= 10:
+        return None
+
+    return summary
+
+def _numeric_accumulators(field):
+    return {
+        'count': {'$sum': 1},
+        'std': {'$stdDevSamp': field},
+        'median': {'$median': {'input': field, 'method': 'approximate'}},
+        'min': {'$min': field},
+        'max': {'$max': field},
+        'mean': {'$avg': field},
+    }
+
+def _numeric_statistics(doc):
+    std = doc.get('std')
+    std = np.nan if std is None else std
+    return {
+        'count': doc['count'],
+        'std': std,
+        'var': std ** 2,
+        'median': np.nan if doc.get('median') is None else doc['median'],
+        'min': doc['min'],
+        'max': doc['max'],
+        'mean': doc['mean'],
+    }
+
+def _bin_expression(field, edges):
+    # pd.cut bins are closed on the right: (edges[i], edges[i + 1]]
+    return {'$switch': {
+        'branches': [
+            {'case': {'$lte': [field, float(edge)]}, 'then': index}
+            for index, edge in enumerate(edges[1:-1])
+        ],
+        'default': len(edges) - 2,
+    }}
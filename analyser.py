@@ -1,63 +1,157 @@
 import pandas as pd
 import numpy as np
-from pymongo import MongoClient
-import os
-from dotenv import load_dotenv
-from helpers import dd, round_float, density_curve
+import asyncio
+from cache import dataset_cache, select_columns
+from loader import load_dataset
+from aggregation import use_pushdown, aggregate_bins_in_mongo
+from inference import infer_column
+from profiles import use_profiles, refresh_profile, summarise_profile
+from streaming import use_streaming, stream_profile, stream_bins
+from sampling import use_sampling, sample_dataset, approximate_outcome
+from windows import windowed, load_window
+from downsampling import LINE_MAX_POINTS, SCATTER_DENSITY_BINS, lttb, density_grid
+from concurrent.futures.process import BrokenProcessPool
+from workers import EXTRACT_WORKERS, EXTRACT_PARALLEL_MIN_COLUMNS, run_analysis, can_map_columns, map_columns
+from metrics import timed
+from helpers import dd, round_float, round_floats, round_array, density_curve
 from math import sqrt
-from Exceptions import ParseColException, SummeriseColException, IDLikeColumnException
+from Exceptions import ParseColException, SummeriseColException, IDLikeColumnException, InvalidCursorException
 
 
+async def line(dataset, independent_variable, dependent_variable, category_variable=None, max_points=None, layout='pairs', x_min=None, x_max=None, limit=None, after=None, version=None):
+    max_points = LINE_MAX_POINTS if max_points is None else int(max_points)
+    if not windowed(x_min, x_max, limit, after):
+        df = await _load_xy(dataset, independent_variable, dependent_variable, category_variable, version)
+        return await run_analysis(_line_chart, df, independent_variable, dependent_variable, category_variable, max_points, layout)
 
+    df, next_page = await load_window(dataset, independent_variable, [dependent_variable, category_variable], x_min, x_max, limit, after, version)
+    # the window is already in (x, row) order; a stable sort keeps pages contiguous
+    result = await run_analysis(_line_chart, df, independent_variable, dependent_variable, category_variable, max_points, layout, 'stable')
+    if limit is not None or after is not None:
+        result['next'] = next_page
+    return result
 
-load_dotenv()
+async def scatter(dataset, independent_variable, dependent_variable, category_variable=None, mode='points', bins=None, layout='pairs', x_min=None, x_max=None, limit=None, after=None, version=None):
+    if mode != 'density':
+        # LTTB keeps the shape of a line; a scatter shows every point
+        return await line(dataset, independent_variable, dependent_variable, category_variable, 0, layout, x_min, x_max, limit, after, version)
+    if limit is not None or after is not None:
+        raise InvalidCursorException('a density scatter counts the whole window: limit and after page points only')
 
-def get_dataframe_from_mongo(query={}):
-    mongo_uri = os.getenv("MONGO_URI")
-    db_name = os.getenv("DB_NAME")
-    collection_name = os.getenv("COLLECTION_NAME")
-    client = MongoClient(mongo_uri) 
-    db = client[db_name]
-    collection = db[collection_name]
+    if windowed(x_min, x_max):
+        df, _ = await load_window(dataset, independent_variable, [dependent_variable, category_variable], x_min, x_max, version=version)
+    else:
+        df = await _load_xy(dataset, independent_variable, dependent_variable, category_variable, version)
+    bins = SCATTER_DENSITY_BINS if bins is None else int(bins)
+    return await run_analysis(_scatter_density, df, independent_variable, dependent_variable, category_variable, bins)
 
-    cursor = collection.find(query).sort({ 'row_index': 1 })
-    data = list(cursor)
-    records = [doc['data'] for doc in data if 'data' in doc]
+def _line_chart(df, independent_variable, dependent_variable, category_variable=None, max_points=0, layout='pairs', sort_kind='quicksort'):
+    df = _xy_frame(df, independent_variable, dependent_variable, category_variable, sort_kind)
+    result = {
+        "xLabel":independent_variable,
+        "yLabel":dependent_variable,
+        "categories":[],
+        "series":[]
+    }
+    
+    if category_variable is None:
+        del result['categories']
+        result['series'].append({
+            "name": f"{dependent_variable} base {independent_variable}",
+            "data": _points(df[independent_variable], df[dependent_variable], max_points, layout),
+        })
+        return result
 
-    return pd.DataFrame(records)
+    for category, group in df.groupby(category_variable, observed=True):
+        result['categories'].append(category)
+        result['series'].append({
+            "name": category,
+            "data": _points(group[independent_variable], group[dependent_variable], max_points, layout),
+        })
+    return result
 
-def line(dataset, independent_variable, dependent_variable, category_variable=None):
-    df = get_dataframe_from_mongo({"dataset_id":{"$eq":int(dataset)}})
-    df[independent_variable] = pd.to_numeric(df[independent_variable], errors='coerce')
-    df[dependent_variable] = pd.to_numeric(df[dependent_variable], errors='coerce')
-    df = df.dropna(subset=[independent_variable, dependent_variable, category_variable]) if category_variable is not None else df.dropna(subset=[independent_variable, dependent_variable])
-    df.sort_values(by=independent_variable, inplace=True)
+def _scatter_density(df, independent_variable, dependent_variable, category_variable=None, bins=SCATTER_DENSITY_BINS):
+    df = _xy_frame(df, independent_variable, dependent_variable, category_variable)
     result = {
         "xLabel":independent_variable,
         "yLabel":dependent_variable,
+        "xAxis":[],
+        "yAxis":[],
         "categories":[],
         "series":[]
     }
-    
+    if df.empty:
+        return result
+
+    # shared edges so the grids of every category line up
+    x_edges = np.histogram_bin_edges(df[independent_variable], bins=bins)
+    y_edges = np.histogram_bin_edges(df[dependent_variable], bins=bins)
+    result['xAxis'] = _edge_labels(x_edges)
+    result['yAxis'] = _edge_labels(y_edges)
+
     if category_variable is None:
         del result['categories']
-        data = df[[independent_variable, dependent_variable]].to_numpy().tolist()
         result['series'].append({
             "name": f"{dependent_variable} base {independent_variable}",
-            "data": [[round_float(i[0]), round_float(i[-1])] for i in data],
+            "data": density_grid(df[independent_variable], df[dependent_variable], x_edges, y_edges),
         })
         return result
 
-    for category, group in df.groupby(category_variable):
-        data = group[[independent_variable, dependent_variable]].to_numpy().tolist() 
+    for category, group in df.groupby(category_variable, observed=True):
         result['categories'].append(category)
         result['series'].append({
             "name": category,
-            "data": [[round_float(i[0]), round_float(i[-1])] for i in data],
+            "data": density_grid(group[independent_variable], group[dependent_variable], x_edges, y_edges),
         })
     return result
 
-def histogram(dataset, independent_variable, category_variable=None, statistic='frequency'):
+async def _load_xy(dataset, independent_variable, dependent_variable, category_variable=None, version=None):
+    columns = [col for col in [independent_variable, dependent_variable, category_variable] if col is not None]
+    df, version = await load_dataset(dataset, columns, version)
+    return df
+
+def _xy_frame(df, independent_variable, dependent_variable, category_variable=None, sort_kind='quicksort'):
+    # a frame of its own, possibly a window sliced from another: the columns are replaced, not written into
+    df = df.copy(deep=False)
+    df[independent_variable] = pd.to_numeric(df[independent_variable], errors='coerce')
+    df[dependent_variable] = pd.to_numeric(df[dependent_variable], errors='coerce')
+    df = df.dropna(subset=[independent_variable, dependent_variable, category_variable]) if category_variable is not None else df.dropna(subset=[independent_variable, dependent_variable])
+    df.sort_values(by=independent_variable, inplace=True, kind=sort_kind)
+    return df
+
+def _points(x, y, max_points=0, layout='pairs'):
+    # arrays, not lists: the response is serialized straight from them
+    x, y = x.to_numpy(dtype=float), y.to_numpy(dtype=float)
+    if max_points:
+        keep = lttb(x, y, max_points)
+        x, y = x[keep], y[keep]
+    x, y = round_array(x, exact=True), round_array(y, exact=True)
+    if layout == 'columns':
+        return {"x": x, "y": y}
+    if x.dtype != y.dtype or x.dtype == object:
+        # one numeric dtype for both would turn integral values into floats
+        return np.column_stack([x.astype(object), y.astype(object)])
+    return np.column_stack([x, y])
+
+def _edge_labels(edges):
+    # the histogram labels round_float'ed NumPy edges, which round the scaled value
+    edges = round_floats(edges, exact=False)
+    return [f"{left} , {right}" for left, right in zip(edges[:-1], edges[1:])]
+
+async def histogram(dataset, independent_variable, category_variable=None, statistic='frequency', execution=None, version=None):
+    aggregated = None
+    if use_pushdown(execution, statistic):
+        aggregated = await aggregate_bins_in_mongo(dataset, independent_variable, category_variable)
+    if aggregated is None and await use_streaming(execution, dataset, version):
+        aggregated = await stream_bins(dataset, independent_variable, category_variable, statistic == 'density')
+
+    if aggregated is None:
+        columns = [col for col in [independent_variable, category_variable] if col is not None]
+        df, version = await load_dataset(dataset, columns, version)
+        aggregated = await run_analysis(_bin_frame, df, independent_variable, category_variable, dataset, version, statistic == 'density')
+    return _histogram_chart(aggregated, independent_variable, category_variable, statistic)
+
+def _histogram_chart(binned, independent_variable, category_variable=None, statistic='frequency'):
     lookup_table = {
         'frequency': 'count',
         'percent': 'count',
@@ -73,234 +167,192 @@ def histogram(dataset, independent_variable, category_variable=None, statistic='
             "categories": [],
     }
     if statistic == 'density':
-        result["density_curve"] = []
-    
-    necessary_columns = [col for col in ['$$independent_variable', category_variable] if col is not None]
-    
-    df = get_dataframe_from_mongo({"dataset_id":{"$eq":int(dataset)}}) 
-    df['$$independent_variable'] = df[independent_variable]
-    df = df[necessary_columns]
-    if category_variable is not None and df[category_variable].any():
-        df['$$category_variable'] = df[category_variable]
-        del df[category_variable]
-    
-
-    d_type, parsed_col = _parse_col(df, '$$independent_variable')
-    del parsed_col
+        result["density_curve"] = binned.get('density_curve', [])
+    if 'exact' in binned:
+        result['exact'] = binned['exact']
 
-    if d_type == 'categorical':
-        df['$$bins'] = df['$$independent_variable']
-        statistics = ['count']
-        result['statistics']['overall_statitis'] = df['$$independent_variable'].agg(statistics).to_dict()
-    else :
-        df['$$independent_variable'] = pd.to_numeric(df['$$independent_variable'], errors='coerce')
-        df['$$bins'] = pd.cut(df['$$independent_variable'], bins=10)
-        statistics = [ 'count', 'std','var', 'median', 'min', 'max', 'mean']
-    
-    df.dropna(inplace=True)
-    
-    overall_statitis =  df['$$independent_variable'].agg(statistics).to_dict()
-    for key, value in overall_statitis.items():
-        overall_statitis[key] = round_float(value)
+    overall_statitis, groups, x_axis = binned['overall_statitis'], binned['groups'], binned['x_axis']
     result['statistics']['overall_statitis'] = overall_statitis
 
-    if category_variable :
-        groups = df.groupby(['$$bins', '$$category_variable'],observed=False)['$$independent_variable'].agg(statistics).reset_index()
-    else:
-        if statistic == 'density' and d_type == 'numeric':
-            d_curve = density_curve(df['$$independent_variable'])
-            if d_curve is not None: 
-                result['density_curve'].append(d_curve)
-        groups = df.groupby('$$bins',observed=False)['$$independent_variable'].agg(statistics).reset_index()
-    data = []
-    series = dict()
     result['categories'] = groups['$$category_variable'].unique() if category_variable else []
         
     result['categories'] = sorted([b for b in result['categories'] if b is not None])
-    result['xAxis'] = sorted([b for b in df['$$bins'].unique() if b is not None])
-    series = dict()
-    calculated_density_curves = set()
-    for b in result['xAxis']:
-        if category_variable:
-            for cat in result['categories']:
-                
-                if statistic == 'density' and d_type == 'numeric' and cat not in calculated_density_curves:
-                    calculated_density_curves.add(cat)
-                    d_curve = df[(df['$$category_variable'] == cat) & (df['$$bins'] == b)]['$$independent_variable']
-                    d_curve = density_curve(d_curve, cat)
-                    if d_curve is not None:
-                        result['density_curve'].append(d_curve)  
-                    
-                row = groups[(groups['$$bins'] == b) & (groups['$$category_variable'] == cat)]
-                if not row.empty:
-                    stat = round_float(row.iloc[0][lookup_table[statistic]])
-                    if statistic == 'percent':
-                        stat = (stat / overall_statitis['count']) * 100
-                    elif statistic == 'density':
-                        stat = (stat / overall_statitis['count'])
-                    stat = round_float(stat)
-
-                else:
-                    stat = 0
-                
-                if not series.get(cat):
-                    series[cat] = {
-                        'name': cat,
-                        'data': []
-                    }
-                
-                series[cat]['data'].append(stat)
-                                    
-        else:
-            row = groups[(groups['$$bins'] == b)]
-            if not row.empty:
-                stat = row.iloc[0][lookup_table[statistic]]
-                if statistic == 'percent':
-                    stat = (stat / overall_statitis['count']) * 100
-                elif statistic == 'density':
-                    stat = (stat / overall_statitis['count'])
-                stat = round_float(stat)
-            else:
-                stat = 0
-            
-            data.append(stat)
-            
-    for index, bin in enumerate(result['xAxis']):
-        if  isinstance(bin, pd.Interval):
-            result['xAxis'][index] = f"{ round_float(bin.left)} , { round_float(bin.right)}"
-    if data :
-        result['series'].append({
-            'data':data
-        })
-    if series:
-        for key, data in series.items():
-            result['series'].append(data)
+    result['xAxis'] = x_axis
+
+    result['series'] = _series_from_groups(groups, result['xAxis'], result['categories'] if category_variable else None, lookup_table[statistic], statistic, overall_statitis['count'])
+
+    result['xAxis'] = [f"{ round_float(bin.left)} , { round_float(bin.right)}" if isinstance(bin, pd.Interval) else bin for bin in result['xAxis']]
     
     return result
 
-def extract(dataset, replace_missing_values=False):
-    df = get_dataframe_from_mongo({"dataset_id":{"$eq":int(dataset)}}) 
-
+async def extract(dataset, replace_missing_values=False, incremental=None, execution=None, approximate=None, sample_size=None, time_budget=None, version=None):
+    if use_sampling(approximate):
+        sample, rows = await sample_dataset(dataset, sample_size, time_budget, version)
+        if sample is not None and len(sample):
+            outcomes = await run_analysis(_summarise_sample, sample, rows, replace_missing_values)
+            return await _complete_outcomes(dataset, outcomes, rows, replace_missing_values, version)
+    if use_profiles(incremental):
+        return await _extract_from_profile(dataset, await refresh_profile(dataset, version), replace_missing_values, version)
+    if await use_streaming(execution, dataset, version):
+        return await _extract_from_profile(dataset, await stream_profile(dataset), replace_missing_values, version)
+
+    df, version = await load_dataset(dataset, version=version)
+    return await run_analysis(_summarise_frame, df, replace_missing_values, dataset, version)
+
+@timed('summarise')
+def _summarise_frame(df, replace_missing_values=False, dataset=None, version=None):
     metadata = {
         'parsed_colums': [],
         'unrecognized_format' : []
     }
     df_rows = len(df)
+    columns = list(enumerate(df.columns))
 
-    for index, col in enumerate(df.columns):
+    outcomes = None
+    if len(columns) >= EXTRACT_PARALLEL_MIN_COLUMNS and can_map_columns(columns):
+        size = -(-len(columns) // (4 * EXTRACT_WORKERS))
+        chunks = [columns[start:start + size] for start in range(0, len(columns), size)]
         try:
-            if col in ['id', '_id'] or (index == 0 and len(pd.to_numeric(df[col], errors='coerce').unique()) == df_rows):
-                if col == '_id':
-                    col = 'id'
-                raise IDLikeColumnException(f'Structure of {col} is like identifier columns.')
-            d_type, parsed_col = _parse_col(df, col)
-
-            summary = None
-            if d_type == 'numeric':
-                summary = summarise_numeric_col(parsed_col, d_type, replace_missing_values, col)
-                metadata['parsed_colums'].append(summary)
-                continue
-
-            elif d_type == 'date':
-                summary = summerise_date_col(parsed_col, d_type, col)
-                metadata['parsed_colums'].append(summary)
-                continue
-
-            elif d_type == "categorical":
-                if len(parsed_col.dropna().unique()) >= df_rows:
-                    raise IDLikeColumnException(f'Structure of {col} is like identifier columns.')
-                summary = summerise_categorical_col(parsed_col, d_type, col)
-                metadata['parsed_colums'].append(summary)
-                continue
-        
-        except IDLikeColumnException as i:
-            metadata['unrecognized_format'].append({
-                "message": f"{i}",
-                "column": col,
-                "type": "identifier",
-            })
-            continue       
+            results = [result for chunk in map_columns(_summarise_chunk, df, chunks, df_rows, replace_missing_values) for result in chunk]
+        except BrokenProcessPool:
+            results = None
+        if results is not None:
+            outcomes = []
+            for (index, col), (outcome, inferred) in zip(columns, results):
+                if inferred is not None and dataset is not None:
+                    if inferred['parsed'] is None:
+                        inferred = dict(inferred, parsed=df[col])
+                    dataset_cache.put_inference(int(dataset), version, col, inferred)
+                outcomes.append(outcome)
+
+    if outcomes is None:
+        outcomes = [_summarise_col(df, index, col, df_rows, replace_missing_values, dataset, version) for index, col in columns]
+
+    for key, summary in outcomes:
+        metadata[key].append(summary)
 
-        except Exception as e:
-            metadata['unrecognized_format'].append({
-                "message": f"{repr(e)}",
-                "column": col,
-                "type": "Unkown",
-            })
-            continue
-                                
+    return metadata
 
-        if not summary:
-            metadata['unrecognized_format'].append({
-                "column": col,
-                "type": "Unkown",
-                "message": f"Some thing unpredicted happend for column {col}(please report this)"
-            })
-            continue
+def _summarise_chunk(df, columns, df_rows, replace_missing_values=False):
+    # runs on an extract process, which has no dataset cache: the inferences
+    # are returned for the parent to memoise, a raw column as parsed=None
+    results = []
+    for index, col in columns:
+        inferred = None
+        if col not in ['id', '_id']:
+            column = df[col]
+            try:
+                inferred = infer_column(column)
+            except Exception:
+                pass
+        outcome = _summarise_col(df, index, col, df_rows, replace_missing_values, inferred=inferred)
+        if inferred is not None:
+            inferred = dict(inferred, parsed=None if inferred['parsed'] is column else inferred['parsed'].copy())
+        results.append((outcome, inferred))
+    return results
+
+def _summarise_sample(sample, rows, replace_missing_values=False):
+    # no dataset/version: inferences on a sample must not reach the dataset cache
+    return [
+        (col, approximate_outcome(_summarise_col(sample, index, col, len(sample), replace_missing_values), sample[col], len(sample), rows))
+        for index, col in enumerate(sample.columns)
+    ]
+
+async def _extract_from_profile(dataset, profile, replace_missing_values=False, version=None):
+    outcomes = await run_analysis(summarise_profile, profile, replace_missing_values)
+    return await _complete_outcomes(dataset, outcomes, profile['rows'], replace_missing_values, version)
+
+async def _complete_outcomes(dataset, outcomes, rows, replace_missing_values=False, version=None):
+    # columns without an outcome are summarised from a scan of just those columns
+    df = None
+    exact_columns = [col for col, outcome in outcomes if outcome is None]
+    if exact_columns:
+        df, version = await load_dataset(dataset, exact_columns, version)
+    return await run_analysis(_merge_outcomes, outcomes, df, rows, replace_missing_values, dataset, version)
+
+def _merge_outcomes(outcomes, df, rows, replace_missing_values=False, dataset=None, version=None):
+    metadata = {
+        'parsed_colums': [],
+        'unrecognized_format' : []
+    }
+    for index, (col, outcome) in enumerate(outcomes):
+        if outcome is None:
+            outcome = _summarise_col(df, index, col, rows, replace_missing_values, dataset, version)
+        key, summary = outcome
+        metadata[key].append(summary)
 
     return metadata
 
-def _is_numeric(df, col):
-    d_type, parsed_col = None, None
-    parsed_col = pd.to_numeric(df[col], errors='coerce')
-
-    numerator = parsed_col.notna().sum()
-    denominator = df[col].isna().sum() 
-    denominator = denominator if denominator > 0 else 1 
+def _summarise_col(df, index, col, df_rows, replace_missing_values=False, dataset=None, version=None, inferred=None):
+    try:
+        if col in ['id', '_id']:
+            if col == '_id':
+                col = 'id'
+            raise IDLikeColumnException(f'Structure of {col} is like identifier columns.')
+        inferred = inferred or _infer_col(df, col, dataset, version)
+        if index == 0 and _numeric_distinct(df, col, inferred) == df_rows:
+            raise IDLikeColumnException(f'Structure of {col} is like identifier columns.')
+        d_type, parsed_col = inferred['type'], inferred['parsed']
+
+        summary = None
+        if d_type == 'numeric':
+            summary = summarise_numeric_col(parsed_col, d_type, replace_missing_values, col)
+
+        elif d_type == 'date':
+            summary = summerise_date_col(parsed_col, d_type, col)
+
+        elif d_type == "categorical":
+            if len(parsed_col.dropna().unique()) >= df_rows:
+                raise IDLikeColumnException(f'Structure of {col} is like identifier columns.')
+            summary = summerise_categorical_col(parsed_col, d_type, col)
 
-    if (numerator / denominator) > 0.1 and len(parsed_col.dropna().unique()) > 10:
-        d_type = 'numeric'
-    else:
-        parsed_col = None
-    
-    return d_type, parsed_col
+    except IDLikeColumnException as i:
+        return 'unrecognized_format', {
+            "message": f"{i}",
+            "column": col,
+            "type": "identifier",
+        }
 
-def _is_date(df, col):
-    d_type, parsed_col = None, None
+    except Exception as e:
+        return 'unrecognized_format', {
+            "message": f"{repr(e)}",
+            "column": col,
+            "type": "Unkown",
+        }
 
-    parsed_col = pd.to_datetime(df[col], format='%Y-%m-%d', errors='coerce')
-    numerator = parsed_col.notna().sum()
-    denominator = df[col].isna().sum() 
-    denominator = denominator if denominator > 0 else 1 
+    if not summary:
+        return 'unrecognized_format', {
+            "column": col,
+            "type": "Unkown",
+            "message": f"Some thing unpredicted happend for column {col}(please report this)"
+        }
 
-    if (numerator / denominator) > 0.1 or len(parsed_col.dropna().unique()) > 10:
-        d_type = 'date'
-    else:
-        parsed_col = None
-    
-    return d_type, parsed_col
+    return 'parsed_colums', summary
 
-def _distict_between_numeric_and_categorical(df, col):
-    d_type, parsed_col = None, None
+def _infer_col(df, col, dataset=None, version=None, source_col=None):
+    source_col = source_col or col
+    inferred = None
+    if dataset is not None:
+        inferred = dataset_cache.get_inference(int(dataset), version, source_col)
 
-    parsed_col = df[col]
-    if len(parsed_col.dropna().unique()) > 10:
+    if inferred is None:
         try:
-            pd.to_numeric(df[col], errors='raise')
-            d_type = 'numeric'
-        except:
-            d_type = 'categorical'
-    else:
-        d_type = 'categorical'
+            inferred = infer_column(df[col])
+        except Exception as e:
+            raise ParseColException(f'unable to parse column {col}({repr(e)})') 
+        if dataset is not None:
+            dataset_cache.put_inference(int(dataset), version, source_col, inferred)
 
-    return d_type, parsed_col
+    return inferred
 
-def _parse_col(df, col):
-    try:
-        d_type = None
-        parsed_col = None
+def _numeric_distinct(df, col, inferred):
+    if inferred['numeric_distinct'] is not None:
+        return inferred['numeric_distinct']
+    return len(pd.to_numeric(df[col], errors='coerce').unique())
 
-        
-        d_type, parsed_col = _is_numeric(df, col)    
-        if parsed_col is None and d_type is None:
-            d_type, parsed_col = _is_date(df, col)
-        
-        if parsed_col is None and d_type is None:
-            d_type, parsed_col = _distict_between_numeric_and_categorical(df, col)
-        
-        return d_type, parsed_col
-    except Exception as e:
-        raise ParseColException(f'unable to parse column {col}({repr(e)})') 
+def _parse_col(df, col, dataset=None, version=None, source_col=None):
+    inferred = _infer_col(df, col, dataset, version, source_col)
+    return inferred['type'], inferred['parsed']
 
 def summarise_numeric_col(parsed_col, d_type, replace_missing_values, col):
     try:
@@ -368,7 +420,20 @@ def summerise_categorical_col(parsed_col, d_type, col):
     except Exception as e:
         raise SummeriseColException(f'unable to summerise column {col}({repr(e)})') 
 
-def bar(dataset, independent_variable, category_variable=None, statistic='frequency'):
+async def bar(dataset, independent_variable, category_variable=None, statistic='frequency', execution=None, version=None):
+    aggregated = None
+    if use_pushdown(execution, statistic):
+        aggregated = await aggregate_bins_in_mongo(dataset, independent_variable, category_variable)
+    if aggregated is None and await use_streaming(execution, dataset, version):
+        aggregated = await stream_bins(dataset, independent_variable, category_variable)
+
+    if aggregated is None:
+        columns = [col for col in [independent_variable, category_variable] if col is not None]
+        df, version = await load_dataset(dataset, columns, version)
+        aggregated = await run_analysis(_bin_frame, df, independent_variable, category_variable, dataset, version)
+    return _bar_chart(aggregated, independent_variable, category_variable, statistic)
+
+def _bar_chart(binned, independent_variable, category_variable=None, statistic='frequency'):
     lookup_table = {
         'frequency': 'count',
         'percent': 'count',
@@ -386,93 +451,194 @@ def bar(dataset, independent_variable, category_variable=None, statistic='freque
             "categories": [],
             
     }
+    if 'exact' in binned:
+        result['exact'] = binned['exact']
+
+    overall_statitis, groups, x_axis = binned['overall_statitis'], binned['groups'], binned['x_axis']
+    result['statistics']['overall_statitis'] = overall_statitis
+
+    result['categories'] = groups['$$category_variable'].unique() if category_variable else []
+        
+    result['categories'] = sorted([b for b in result['categories'] if b is not None])
+    result['xAxis'] = x_axis
+
+    scale = statistic if statistic == 'percent' else None
+    # the original per-category loop scaled the rounded counts and left the percentages unrounded
+    result['series'] = _series_from_groups(groups, result['xAxis'], result['categories'] if category_variable else None, lookup_table[statistic], scale, overall_statitis['count'], round_scaled=not category_variable)
+
+    result['xAxis'] = [f"{ round_float(bin.left)} , { round_float(bin.right)}" if isinstance(bin, pd.Interval) else bin for bin in result['xAxis']]
     
-    necessary_columns = [col for col in ['$$independent_variable', category_variable] if col is not None]
-    
-    df = get_dataframe_from_mongo({"dataset_id":{"$eq":int(dataset)}}) 
-    df['$$independent_variable'] = df[independent_variable]
-    df = df[necessary_columns]
-    if category_variable is not None and df[category_variable].any():
-        df['$$category_variable'] = df[category_variable]
-        del df[category_variable]
-    
+    return result
+
+SPEC_COLUMNS = ['independent_variable', 'dependent_variable', 'category_variable']
+
+async def batch(dataset, charts):
+    """Build several charts of one dataset from a single load.
+
+    ``charts`` is a list of specs such as ``{'type': 'histogram',
+    'independent_variable': 'age', 'statistic': 'percent'}``; ``type`` is one of
+    extract, line, scatter, histogram or bar and the other keys are the
+    parameters of the matching endpoint. The union of the columns the specs
+    need is loaded once and column types are inferred once through the
+    dataset cache. Results come back in spec order; a failing or malformed
+    spec (not an object, a column that is not a string) yields
+    ``{'type', 'error'}`` without affecting the others.
+    """
+    columns = []
+    for chart in charts:
+        try:
+            _check_spec(chart)
+        except ValueError:
+            # reported in its place by _batch_charts
+            continue
+        if chart.get('type') == 'extract':
+            columns = None
+            break
+        columns += [chart.get(key) for key in SPEC_COLUMNS if chart.get(key) is not None]
 
-    d_type, parsed_col = _parse_col(df, '$$independent_variable')
+    df, version = await load_dataset(dataset, columns)
+    return await run_analysis(_batch_charts, df, charts, dataset, version)
+
+def _batch_charts(df, charts, dataset=None, version=None):
+    results = []
+    for chart in charts:
+        try:
+            results.append(_batch_chart(df, chart, dataset, version))
+        except Exception as e:
+            results.append({
+                "type": chart.get('type') if isinstance(chart, dict) else None,
+                "error": f"{repr(e)}",
+            })
+    return {'charts': results}
+
+def _check_spec(chart):
+    if not isinstance(chart, dict):
+        raise ValueError(f'a chart spec must be an object, got {type(chart).__name__}')
+    for key in SPEC_COLUMNS:
+        if chart.get(key) is not None and not isinstance(chart[key], str):
+            raise ValueError(f'{key} must be a column name, got {chart[key]!r}')
+
+def _batch_chart(df, chart, dataset=None, version=None):
+    _check_spec(chart)
+    chart_type = chart.get('type')
+    if chart_type == 'extract':
+        return _summarise_frame(df, chart.get('replace_missing_values', False), dataset, version)
+
+    independent_variable = chart['independent_variable']
+    dependent_variable = chart.get('dependent_variable')
+    category_variable = chart.get('category_variable')
+    frame = select_columns(df, [col for col in [independent_variable, dependent_variable, category_variable] if col is not None])
+
+    if chart_type == 'line' or (chart_type == 'scatter' and chart.get('mode', 'points') != 'density'):
+        max_points = chart.get('max_points') if chart_type == 'line' else 0
+        max_points = LINE_MAX_POINTS if max_points is None else int(max_points)
+        return _line_chart(frame, independent_variable, dependent_variable, category_variable, max_points, chart.get('layout', 'pairs'))
+    if chart_type == 'scatter':
+        bins = SCATTER_DENSITY_BINS if chart.get('bins') is None else int(chart['bins'])
+        return _scatter_density(frame, independent_variable, dependent_variable, category_variable, bins)
+    if chart_type == 'histogram':
+        statistic = chart.get('statistic', 'frequency')
+        binned = _bin_frame(frame, independent_variable, category_variable, dataset, version, statistic == 'density')
+        return _histogram_chart(binned, independent_variable, category_variable, statistic)
+    if chart_type == 'bar':
+        statistic = chart.get('statistic', 'frequency')
+        binned = _bin_frame(frame, independent_variable, category_variable, dataset, version)
+        return _bar_chart(binned, independent_variable, category_variable, statistic)
+    raise ValueError(f'unknown chart type {chart_type}')
+
+@timed('bin')
+def _bin_frame(df, independent_variable, category_variable=None, dataset=None, version=None, density=False):
+    # a frame of its own over the caller's columns: the columns below are replaced, never written into
+    columns = {'$$independent_variable': df[independent_variable]}
+    if category_variable is not None:
+        columns['$$category_variable' if _any_value(df[category_variable]) else category_variable] = df[category_variable]
+    df = pd.DataFrame(columns, index=df.index, copy=False)
+
+    d_type, parsed_col = _parse_col(df, '$$independent_variable', dataset, version, independent_variable)
     del parsed_col
-    
+
     if d_type == 'categorical':
         df['$$bins'] = df['$$independent_variable']
         statistics = ['count']
-        result['statistics']['overall_statitis'] = df['$$independent_variable'].agg(statistics).to_dict()
     else :
         df['$$independent_variable'] = pd.to_numeric(df['$$independent_variable'], errors='coerce')
         df['$$bins'] = pd.cut(df['$$independent_variable'], bins=10)
         statistics = [ 'count', 'std','var', 'median', 'min', 'max', 'mean']
-    
+
     df.dropna(inplace=True)
+    if '$$category_variable' in df.columns and isinstance(df['$$category_variable'].dtype, pd.CategoricalDtype):
+        # group only the categories left after dropping incomplete rows
+        df['$$category_variable'] = df['$$category_variable'].cat.remove_unused_categories()
+
     overall_statitis =  df['$$independent_variable'].agg(statistics).to_dict()
     for key, value in overall_statitis.items():
         overall_statitis[key] = round_float(value)
-    result['statistics']['overall_statitis'] = overall_statitis
 
+    # compacted string columns are categoricals; group them by the values seen, as the plain strings were
+    observed = d_type == 'categorical'
+    density_curves = []
     if category_variable :
-        groups = df.groupby(['$$bins', '$$category_variable'],observed=False)['$$independent_variable'].agg(statistics).reset_index()
+        groups = df.groupby(['$$bins', '$$category_variable'],observed=observed)['$$independent_variable'].agg(statistics).reset_index()
     else:
-        groups = df.groupby('$$bins',observed=False)['$$independent_variable'].agg(statistics).reset_index()
-    
-    data = []
-    series = dict()
-    result['categories'] = groups['$$category_variable'].unique() if category_variable else []
-        
-    result['categories'] = sorted([b for b in result['categories'] if b is not None])
-    result['xAxis'] = sorted([b for b in df['$$bins'].unique() if b is not None])
-    series = dict()
-    for b in result['xAxis']:
-        if category_variable:
-            for cat in result['categories']:
-                row = groups[(groups['$$bins'] == b) & (groups['$$category_variable'] == cat)]
-                if not row.empty:
-                    stat = round_float(row.iloc[0][lookup_table[statistic]])
-                    if statistic == 'percent':
-                        stat = (stat / overall_statitis['count']) * 100
-                    
-                else:
-                    stat = 0
-                
-                if not series.get(cat):
-                    series[cat] = {
-                        'name': cat,
-                        'data': []
-                    }
-                
-                series[cat]['data'].append(stat)
-                                    
-        else:
-            row = groups[(groups['$$bins'] == b)]
-            if not row.empty:
-                stat = row.iloc[0][lookup_table[statistic]]
-                if statistic == 'percent':
-                    stat = (stat / overall_statitis['count']) * 100
-                stat = round_float(stat)
-            else:
-                stat = 0
-            
-            data.append(stat)
-            
-    for index, bin in enumerate(result['xAxis']):
-        if  isinstance(bin, pd.Interval):
-            result['xAxis'][index] = f"{ round_float(bin.left)} , { round_float(bin.right)}"
-    
-    if data :
-        result['series'].append({
-            'data':data
-        })
-    if series:
-        for key, data in series.items():
-            result['series'].append(data)
-    
-    return result
+        if density and d_type == 'numeric':
+            d_curve = density_curve(df['$$independent_variable'])
+            if d_curve is not None: 
+                density_curves.append(d_curve)
+        groups = df.groupby('$$bins',observed=observed)['$$independent_variable'].agg(statistics).reset_index()
+    x_axis = sorted([b for b in df['$$bins'].unique() if b is not None])
+
+    if category_variable and density and d_type == 'numeric' and x_axis:
+        first_bin = df[df['$$bins'] == x_axis[0]]
+        values = first_bin['$$independent_variable'].to_numpy()
+        positions = first_bin.groupby('$$category_variable', observed=True).indices
+        for cat in sorted([b for b in groups['$$category_variable'].unique() if b is not None]):
+            d_curve = density_curve(values[positions.get(cat, [])], cat)
+            if d_curve is not None:
+                density_curves.append(d_curve)
+
+    return {
+        'd_type': d_type,
+        'overall_statitis': overall_statitis,
+        'groups': groups,
+        'x_axis': x_axis,
+        'density_curve': density_curves,
+    }
+
+def _any_value(column):
+    if isinstance(column.dtype, pd.CategoricalDtype):
+        return column.cat.remove_unused_categories().cat.categories.to_series().any()
+    return column.any()
+
+def _series_from_groups(groups, x_axis, categories, stat_column, scale=None, total=None, round_scaled=True):
+    if not x_axis:
+        return []
+
+    if categories is None:
+        cells = groups.set_index('$$bins')[stat_column].reindex(x_axis)
+    else:
+        cells = groups.set_index(['$$bins', '$$category_variable'])[stat_column].unstack('$$category_variable')
+        cells = cells.reindex(index=x_axis, columns=categories)
+
+    cells = cells.to_numpy(dtype=float, na_value=np.nan)
+    absent = np.isnan(cells)
+    cells = np.nan_to_num(cells)
+    if scale is not None and not round_scaled:
+        cells = round_floats(cells, exact=False)
+    if scale == 'percent':
+        cells = cells / total * 100
+    elif scale == 'density':
+        cells = cells / total
+    # the per-cell loop this replaced rounded NumPy scalars, hence exact=False
+    if scale is None or round_scaled:
+        cells = round_floats(cells, exact=False)
+    else:
+        # cells without a group stayed a plain 0
+        cells = cells.astype(object)
+        cells[absent] = 0
 
+    if categories is None:
+        return [{'data': cells.tolist()}]
+    return [{'name': cat, 'data': cells[:, index].tolist()} for index, cat in enumerate(categories)]
 
 if __name__ == "__main__":
-    print(extract(115))
+    print(asyncio.run(extract(115)))
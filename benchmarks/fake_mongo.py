@@ -0,0 +1,433 @@
+import os
+import numpy as np
+from bson.decimal128 import Decimal128
+from benchmarks.synthetic import documents
+
+
+# An in-process stand-in for the motor client. The data collection
+# (COLLECTION_NAME) is backed by the synthetic columns and answers find,
+# find_one, count_documents, a $match/$sample/$project aggregation and the
+# $match/$group/$limit pipelines of the bin pushdown. Queries may test
+# dataset_id, row_index and data.<field> with equality,
+# $eq/$ne/$gt/$gte/$lt/$lte/$in, $type (by BSON type name, 'number' for any
+# of them) and $not, and combine them with $or; find sorts on row_index and
+# data.<field>, values of mixed types in BSON order, and takes a limit.
+# $median returns the lower middle value, a stand-in for the server's
+# approximate one. Documents are built from the synthetic columns while the
+# cursor is read, as motor would decode them from BSON. Any other
+# collection (the column profiles) is a plain list of documents.
+
+_MISSING = object()
+NUMBER_TYPES = ['double', 'int', 'long', 'decimal']
+
+class FakeClient:
+
+    def __init__(self):
+        self.datasets = dict()
+        self.collections = dict()
+
+    def add(self, dataset_id, dataset):
+        self.datasets[dataset_id] = dataset
+        for collection in self.collections.values():
+            collection.delete_dataset(dataset_id)
+
+    def __getitem__(self, name):
+        return FakeDatabase(self)
+
+    def close(self):
+        pass
+
+class FakeDatabase:
+
+    def __init__(self, client):
+        self.client = client
+
+    def __getitem__(self, name):
+        if name in [None, os.getenv('COLLECTION_NAME')]:
+            return FakeCollection(self.client.datasets)
+        return self.client.collections.setdefault(name, FakeDocumentCollection())
+
+class FakeCollection:
+
+    def __init__(self, datasets):
+        self.datasets = datasets
+
+    def _match(self, query):
+        query = dict(query or {})
+        dataset_id = _operand(query.pop('dataset_id', None), '$eq')
+        dataset = self.datasets.get(dataset_id)
+        if dataset is None:
+            return dataset_id, None, np.zeros(0, dtype=int)
+        return dataset_id, dataset, np.flatnonzero(self._mask(dataset, query))
+
+    def _mask(self, dataset, query):
+        rows = len(dataset['id'][0])
+        mask = np.ones(rows, dtype=bool)
+        for key, condition in query.items():
+            if key == '$or':
+                mask &= np.logical_or.reduce([self._mask(dataset, branch) for branch in condition])
+            elif key == 'row_index':
+                mask &= _condition(np.arange(rows), np.zeros(rows, dtype=bool), condition)
+            elif key.startswith('data.'):
+                values, missing = dataset.get(key[len('data.'):], (np.zeros(rows), np.ones(rows, dtype=bool)))
+                mask &= _condition(values, missing, condition)
+            else:
+                raise NotImplementedError(f'unsupported query {query}')
+        return mask
+
+    def find(self, query=None, projection=None):
+        dataset_id, dataset, rows = self._match(query)
+        return FakeCursor(dataset, dataset_id, rows, projection)
+
+    async def find_one(self, query=None, projection=None, sort=None):
+        cursor = self.find(query, projection)
+        if sort:
+            cursor.sort(sort)
+        return next(iter(cursor.limit(1)), None)
+
+    async def count_documents(self, query=None):
+        return len(self._match(query)[2])
+
+    def aggregate(self, pipeline):
+        stages = {name: value for stage in pipeline for name, value in stage.items()}
+        if '$group' in stages:
+            return self._group(pipeline)
+        if set(stages) - {'$match', '$sample', '$project'}:
+            raise NotImplementedError(f'unsupported pipeline {pipeline}')
+
+        dataset_id, dataset, rows = self._match(stages.get('$match'))
+        size = min(stages.get('$sample', {}).get('size', len(rows)), len(rows))
+        return FakeCursor(dataset, dataset_id, np.random.default_rng().choice(rows, size, replace=False))
+
+    def _group(self, pipeline):
+        (match, group), rest = [next(iter(stage.items())) for stage in pipeline[:2]], pipeline[2:]
+        if match[0] != '$match' or group[0] != '$group' or any(set(stage) - {'$limit'} for stage in rest):
+            raise NotImplementedError(f'unsupported pipeline {pipeline}')
+
+        group = dict(group[1])
+        key = group.pop('_id')
+        groups = dict()
+        for document in self.find(match[1]):
+            _id = _evaluate(key, document)
+            groups.setdefault(repr(_id), (_id, []))[1].append(document)
+
+        results = []
+        for _id, members in groups.values():
+            result = {'_id': _id}
+            for name, accumulator in group.items():
+                (operator, expression), = accumulator.items()
+                result[name] = _accumulate(operator, expression, members)
+            results.append(result)
+        for stage in rest:
+            results = results[:stage['$limit']]
+        return FakeDocumentCursor(results)
+
+    async def create_index(self, keys, name=None, **kwargs):
+        return name or '_'.join(f'{key}_{direction}' for key, direction in keys)
+
+    async def index_information(self):
+        return {}
+
+class FakeCursor:
+
+    def __init__(self, dataset, dataset_id, rows, projection=None):
+        self.dataset = dataset
+        self.dataset_id = dataset_id
+        self.rows = rows
+        self.projection = projection
+        self._documents = None
+
+    def sort(self, keys, direction=None):
+        if isinstance(keys, str):
+            keys = [(keys, direction or 1)]
+        elif isinstance(keys, dict):
+            keys = list(keys.items())
+        if self.dataset is None:
+            return self
+        # lexsort takes the last key as the primary one
+        columns = []
+        for key, direction in reversed(keys):
+            if key == 'row_index':
+                values = self.rows
+            else:
+                values, missing = self.dataset.get(key[len('data.'):], (None, None))
+                values = np.zeros(len(self.rows)) if values is None else _sort_keys(values[self.rows], missing[self.rows])
+            columns.append(values if direction == 1 else -values)
+        if columns:
+            self.rows = self.rows[np.lexsort(columns)]
+        return self
+
+    def limit(self, size):
+        if size:
+            self.rows = self.rows[:size]
+        return self
+
+    def batch_size(self, size):
+        return self
+
+    def _iterate(self):
+        if self.dataset is None:
+            return
+        columns = None
+        if self.projection is not None and not self.projection.get('data') and any(key.startswith('data.') for key in self.projection):
+            columns = [key[len('data.'):] for key, value in self.projection.items() if key.startswith('data.') and value]
+        for chunk in documents(self.dataset, self.dataset_id, self.rows, columns):
+            for document in chunk:
+                yield _project(document, self.projection)
+
+    def __iter__(self):
+        return self._iterate()
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if self._documents is None:
+            self._documents = self._iterate()
+        try:
+            return next(self._documents)
+        except StopIteration:
+            raise StopAsyncIteration
+
+    async def to_list(self, length=None):
+        return [document async for document in self][:length]
+
+    async def close(self):
+        self.rows = self.rows[:0]
+        self._documents = iter(())
+
+class FakeDocumentCollection:
+
+    def __init__(self):
+        self.documents = []
+
+    def delete_dataset(self, dataset_id):
+        self.documents = [document for document in self.documents if document.get('dataset_id') != dataset_id]
+
+    def find(self, query=None, projection=None):
+        return FakeDocumentCursor([_strip_id(document, projection) for document in self.documents if _matches(document, query or {})])
+
+    async def find_one(self, query=None, projection=None, sort=None):
+        return next(iter(self.find(query, projection).sort(sort or [])), None)
+
+    async def count_documents(self, query=None):
+        return len(self.find(query).documents)
+
+    async def replace_one(self, query, document, upsert=False):
+        for index, existing in enumerate(self.documents):
+            if _matches(existing, query):
+                self.documents[index] = dict(document)
+                return
+        if upsert:
+            self.documents.append(dict(document))
+
+    async def bulk_write(self, requests, ordered=True):
+        for request in requests:
+            # pymongo's ReplaceOne keeps its arguments in private attributes
+            await self.replace_one(request._filter, request._doc, request._upsert)
+
+    async def delete_many(self, query):
+        self.documents = [document for document in self.documents if not _matches(document, query)]
+
+    async def create_index(self, keys, name=None, **kwargs):
+        return name or '_'.join(f'{key}_{direction}' for key, direction in keys)
+
+    async def index_information(self):
+        return {}
+
+class FakeDocumentCursor:
+
+    def __init__(self, documents):
+        self.documents = documents
+
+    def sort(self, keys, direction=None):
+        if isinstance(keys, str):
+            keys = [(keys, direction or 1)]
+        for key, direction in reversed(list(keys)):
+            self.documents.sort(key=lambda document: document[key], reverse=direction == -1)
+        return self
+
+    def __iter__(self):
+        return iter(self.documents)
+
+    async def to_list(self, length=None):
+        return self.documents[:length]
+
+def _condition(values, missing, condition):
+    # the rows whose value meets a query condition, with Mongo's treatment of
+    # missing fields: only {'$eq': None} and negations match them
+    numeric = values.dtype != object
+    if not isinstance(condition, dict):
+        condition = {'$eq': condition}
+
+    mask = np.ones(len(values), dtype=bool)
+    for operator, operand in condition.items():
+        if operator == '$eq':
+            mask &= missing if operand is None else ~missing & _equal(values, operand)
+        elif operator == '$ne':
+            mask &= ~missing if operand is None else missing | ~_equal(values, operand)
+        elif operator in ['$gt', '$gte', '$lt', '$lte']:
+            if isinstance(operand, str):
+                mask &= False
+                continue
+            compare = {'$gt': np.greater, '$gte': np.greater_equal, '$lt': np.less, '$lte': np.less_equal}[operator]
+            if not numeric:
+                # only the numbers of a mixed column compare with a number
+                values = np.array([float(_number(value)) if _bson_type(value) in NUMBER_TYPES else np.nan for value in values])
+            mask &= ~missing & compare(values, operand)
+        elif operator == '$in':
+            mask &= ~missing & np.isin(values, list(operand))
+        elif operator == '$type':
+            types = [operand] if isinstance(operand, str) else list(operand)
+            if 'number' in types:
+                types += NUMBER_TYPES
+            mask &= ~missing & np.isin(_bson_types(values), types)
+        elif operator == '$not':
+            mask &= ~_condition(values, missing, operand)
+        else:
+            raise NotImplementedError(f'unsupported operator {operator}')
+    return mask
+
+def _sort_keys(values, missing):
+    # BSON order: missing and null, then numbers, strings, and any other type
+    if values.dtype != object:
+        return np.where(missing, -np.inf, values)
+    orders = [(0, 0) if gone or value is None else
+              (1, float(_number(value))) if _bson_type(value) in NUMBER_TYPES else
+              (2, value) if isinstance(value, str) else (3, repr(value))
+              for value, gone in zip(values, missing)]
+    ranks = {order: rank for rank, order in enumerate(sorted(set(orders)))}
+    return np.array([ranks[order] for order in orders], dtype=float)
+
+def _bson_types(values):
+    if values.dtype.kind == 'f':
+        return np.full(len(values), 'double')
+    if values.dtype.kind in 'iu':
+        return np.where(np.abs(values) < 2 ** 31, 'int', 'long')
+    return np.array([_bson_type(value) for value in values], dtype=object)
+
+def _bson_type(value):
+    if value is _MISSING:
+        return 'missing'
+    if value is None:
+        return 'null'
+    if isinstance(value, bool):
+        return 'bool'
+    if isinstance(value, int):
+        return 'int' if abs(value) < 2 ** 31 else 'long'
+    if isinstance(value, float):
+        return 'double'
+    if isinstance(value, Decimal128):
+        return 'decimal'
+    if isinstance(value, str):
+        return 'string'
+    return type(value).__name__
+
+def _number(value):
+    return float(value.to_decimal()) if isinstance(value, Decimal128) else value
+
+def _evaluate(expression, document):
+    # aggregation expressions over one document, as far as the pushdown uses them
+    if isinstance(expression, str) and expression.startswith('$'):
+        value = document
+        for part in expression[1:].split('.'):
+            value = value.get(part, _MISSING) if isinstance(value, dict) else _MISSING
+        return value
+    if isinstance(expression, list):
+        return [_evaluate(item, document) for item in expression]
+    if not isinstance(expression, dict):
+        return expression
+    if not all(key.startswith('$') for key in expression):
+        return {key: _evaluate(value, document) for key, value in expression.items()}
+
+    (operator, operand), = expression.items()
+    if operator == '$switch':
+        for branch in operand['branches']:
+            if _evaluate(branch['case'], document):
+                return _evaluate(branch['then'], document)
+        return _evaluate(operand['default'], document)
+    if operator == '$cond':
+        condition, then, otherwise = operand
+        return _evaluate(then if _evaluate(condition, document) else otherwise, document)
+
+    arguments = _evaluate(operand, document)
+    if operator == '$type':
+        return _bson_type(arguments)
+    if operator == '$isNumber':
+        return _bson_type(arguments) in NUMBER_TYPES
+    if operator == '$ifNull':
+        return next((value for value in arguments if value not in [None, _MISSING]), None)
+    if operator == '$in':
+        return arguments[0] in arguments[1]
+    if operator == '$eq':
+        left, right = arguments
+        # NaN equals NaN in MongoDB
+        if isinstance(left, float) and isinstance(right, float) and np.isnan(left) and np.isnan(right):
+            return True
+        return left is not _MISSING and left == right
+    if operator == '$lte':
+        left, right = arguments
+        return left is not _MISSING and left is not None and _number(left) <= _number(right)
+    raise NotImplementedError(f'unsupported expression {expression}')
+
+def _accumulate(operator, expression, documents):
+    if operator == '$median':
+        expression = expression['input']
+    values = [_evaluate(expression, document) for document in documents]
+    if operator == '$sum':
+        return sum(_number(value) for value in values if _bson_type(value) in NUMBER_TYPES)
+
+    numbers = [value for value in values if _bson_type(value) in NUMBER_TYPES]
+    if not numbers:
+        return None
+    if operator == '$min':
+        return min(numbers, key=_number)
+    if operator == '$max':
+        return max(numbers, key=_number)
+    numbers = [float(_number(value)) for value in numbers]
+    if operator == '$avg':
+        return float(np.mean(numbers))
+    if operator == '$stdDevSamp':
+        return float(np.std(numbers, ddof=1)) if len(numbers) > 1 else None
+    if operator == '$median':
+        # a value of the column, as the approximate $median returns
+        return float(np.percentile(numbers, 50, method='lower'))
+    raise NotImplementedError(f'unsupported accumulator {operator}')
+
+def _equal(values, operand):
+    if values.dtype != object and isinstance(operand, str):
+        return np.zeros(len(values), dtype=bool)
+    return values == operand
+
+def _project(document, projection):
+    if projection is None:
+        return document
+    if projection.get('_id', 1) and len(projection) == 1:
+        return {'_id': document['row_index']}
+    result = {key: document[key] for key in ['dataset_id', 'row_index'] if projection.get(key)}
+    if any(key.startswith('data') for key in projection):
+        result['data'] = document['data']
+    return result
+
+def _matches(document, query):
+    for key, condition in query.items():
+        if isinstance(condition, dict) and '$exists' in condition:
+            if (key in document) != condition['$exists']:
+                return False
+        elif isinstance(condition, dict) and '$nin' in condition:
+            if document.get(key) in condition['$nin']:
+                return False
+        elif isinstance(condition, dict) and '$in' in condition:
+            if document.get(key) not in condition['$in']:
+                return False
+        elif document.get(key) != _operand(condition, '$eq'):
+            return False
+    return True
+
+def _strip_id(document, projection):
+    return {key: value for key, value in document.items() if key != '_id' or (projection or {}).get('_id', 1)}
+
+def _operand(condition, operator):
+    if isinstance(condition, dict):
+        return condition.get(operator)
+    return condition
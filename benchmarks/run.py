@@ -0,0 +1,199 @@
+"""Benchmark extract, line, histogram and bar on synthetic datasets.
+
+    python -m benchmarks.run --rows 1000,100000,1000000 --output results.json
+    python -m benchmarks.run --rows 1000,100000,1000000 --baseline results.json
+
+Every combination of --rows, --columns, --cardinality and --missing is a
+scenario. Each operation runs --repeat times from a cold dataset cache and
+without stored column profiles (--warm keeps both between runs) and once
+more under tracemalloc for its peak memory. With --baseline, median
+latencies are compared with a stored run and the exit status is 1 when one
+is slower by more than --tolerance.
+
+The Mongo stand-in answers the finds, lookups and counts of the pandas,
+streaming, profile, sampling and window paths. Its $group evaluates the
+documents one by one in Python, so CHART_EXECUTION=mongo is not
+benchmarked here: the timings would be the stand-in's.
+"""
+import os
+
+# benchmarks measure whole analyses; keep the worker timeout out of the way
+os.environ.setdefault('ANALYSIS_TIMEOUT', '0')
+
+import sys
+import json
+import time
+import asyncio
+import argparse
+import platform
+import resource
+import itertools
+import tracemalloc
+import numpy as np
+import pandas as pd
+import mongo
+import workers
+from cache import dataset_cache
+from analyser import extract, line, scatter, histogram, bar
+from benchmarks.synthetic import make_dataset
+from benchmarks.fake_mongo import FakeClient
+
+
+DATASET_ID = 1
+SAMPLE_SIZE = 1000
+
+OPERATIONS = {
+    'extract': lambda: extract(DATASET_ID),
+    'extract_profiles': lambda: extract(DATASET_ID, incremental='true'),
+    'extract_sample': lambda: extract(DATASET_ID, approximate='true', sample_size=SAMPLE_SIZE),
+    'line': lambda: line(DATASET_ID, 'numeric_0', 'integer_0'),
+    'line_by_category': lambda: line(DATASET_ID, 'numeric_0', 'integer_0', 'categorical_0'),
+    # numeric_0 is normal around 5000 with sd 1500: the window holds about 68% of the rows
+    'line_window': lambda: line(DATASET_ID, 'numeric_0', 'integer_0', x_min=3500, x_max=6500),
+    'line_page': lambda: line(DATASET_ID, 'numeric_0', 'integer_0', limit=1000),
+    'scatter_window': lambda: scatter(DATASET_ID, 'numeric_0', 'integer_0', x_min=3500, x_max=6500),
+    'histogram': lambda: histogram(DATASET_ID, 'numeric_0', 'categorical_0', 'density'),
+    'bar': lambda: bar(DATASET_ID, 'categorical_0', None, 'frequency'),
+    'bar_mean': lambda: bar(DATASET_ID, 'integer_0', 'categorical_0', 'mean'),
+}
+
+async def run_scenario(client, scenario, operations, repeat, warm):
+    client.add(DATASET_ID, make_dataset(scenario['rows'], scenario['columns'], scenario['cardinality'], scenario['missing']))
+    results = []
+    for name in operations:
+        _cold(client)
+        latencies = []
+        for _ in range(repeat):
+            if not warm:
+                _cold(client)
+            start = time.perf_counter()
+            await OPERATIONS[name]()
+            latencies.append(time.perf_counter() - start)
+
+        _cold(client)
+        tracemalloc.start()
+        await OPERATIONS[name]()
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+        median = float(np.median(latencies))
+        results.append({
+            'scenario': scenario,
+            'operation': name,
+            'latency': {
+                'mean': float(np.mean(latencies)),
+                'p50': median,
+                'p95': float(np.percentile(latencies, 95)),
+                'p99': float(np.percentile(latencies, 99)),
+                'max': float(np.max(latencies)),
+            },
+            'operations_per_second': 1 / median if median else None,
+            'rows_per_second': scenario['rows'] / median if median else None,
+            'peak_memory_bytes': peak,
+        })
+        print(_line(results[-1]), flush=True)
+    return results
+
+def _cold(client):
+    dataset_cache.invalidate(DATASET_ID)
+    for collection in client.collections.values():
+        collection.delete_dataset(DATASET_ID)
+
+async def run(args):
+    client = FakeClient()
+    mongo._client = client
+    workers.start()
+    try:
+        results = []
+        for rows, columns, cardinality, missing in itertools.product(args.rows, args.columns, args.cardinality, args.missing):
+            scenario = {'rows': rows, 'columns': columns, 'cardinality': cardinality, 'missing': missing}
+            results += await run_scenario(client, scenario, args.operations, args.repeat, args.warm)
+    finally:
+        workers.shutdown()
+        mongo._client = None
+
+    return {
+        'environment': {
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'pandas': pd.__version__,
+            'machine': platform.machine(),
+            'cpus': os.cpu_count(),
+            'executor': workers.ANALYSIS_EXECUTOR,
+            'warm': args.warm,
+        },
+        # ru_maxrss is in kilobytes on Linux
+        'process_peak_rss_bytes': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024,
+        'results': results,
+    }
+
+def compare(report, baseline, tolerance):
+    """Print the p50 ratio of every operation found in both runs; return the
+    regressions."""
+    def key(result):
+        return json.dumps([result['scenario'], result['operation']], sort_keys=True)
+
+    before = {key(result): result for result in baseline['results']}
+    regressions = []
+    print('\nscenario | operation | baseline p50 | p50 | ratio')
+    for result in report['results']:
+        old = before.get(key(result))
+        if old is None:
+            continue
+        ratio = result['latency']['p50'] / old['latency']['p50'] if old['latency']['p50'] else float('inf')
+        flag = ''
+        if ratio > 1 + tolerance:
+            regressions.append(result)
+            flag = '  REGRESSION'
+        print(f"{_scenario(result['scenario'])} | {result['operation']} | {old['latency']['p50'] * 1000:.1f}ms | {result['latency']['p50'] * 1000:.1f}ms | {ratio:.2f}{flag}")
+    return regressions
+
+def _scenario(scenario):
+    return f"rows={scenario['rows']} columns={scenario['columns']} cardinality={scenario['cardinality']} missing={scenario['missing']}"
+
+def _line(result):
+    latency = result['latency']
+    return (
+        f"{_scenario(result['scenario'])} {result['operation']:>16}: "
+        f"p50 {latency['p50'] * 1000:9.1f}ms  p95 {latency['p95'] * 1000:9.1f}ms  p99 {latency['p99'] * 1000:9.1f}ms  "
+        f"{result['rows_per_second']:12.0f} rows/s  peak {result['peak_memory_bytes'] / 2 ** 20:8.1f}MiB"
+    )
+
+def _list(cast):
+    return lambda value: [cast(item) for item in value.split(',')]
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=_list(int), default=[1000, 10000, 100000])
+    parser.add_argument('--columns', type=_list(int), default=[8])
+    parser.add_argument('--cardinality', type=_list(int), default=[20])
+    parser.add_argument('--missing', type=_list(float), default=[0.05])
+    parser.add_argument('--operations', type=_list(str), default=list(OPERATIONS))
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--warm', action='store_true')
+    parser.add_argument('--output')
+    parser.add_argument('--baseline')
+    parser.add_argument('--tolerance', type=float, default=0.2)
+    args = parser.parse_args(argv)
+
+    unknown = set(args.operations) - set(OPERATIONS)
+    if unknown:
+        parser.error(f'unknown operations {sorted(unknown)}')
+    if min(args.columns) < 5:
+        parser.error('--columns must be at least 5 for every operation to find its columns')
+
+    report = asyncio.run(run(args))
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump(report, file, indent=1)
+
+    if args.baseline:
+        with open(args.baseline) as file:
+            baseline = json.load(file)
+        if compare(report, baseline, args.tolerance):
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,63 @@
+import numpy as np
+
+
+# Synthetic datasets in the data_entries shape. Columns are kept as typed
+# arrays plus a missing mask and only turned into documents while a cursor is
+# read, so a 10M row dataset costs its arrays rather than 10M dicts.
+
+COLUMN_KINDS = ['numeric', 'integer', 'date', 'categorical', 'mixed']
+
+def make_dataset(rows, columns=8, cardinality=20, missing=0.05, seed=0):
+    """Return ``{name: (values, missing_mask)}`` for ``rows`` rows.
+
+    The first column is a row id; the others cycle through COLUMN_KINDS:
+    normal floats, small integers, '%Y-%m-%d' strings, strings drawn from
+    ``cardinality`` categories, and numeric strings with some text mixed in.
+    Every column but the id misses a ``missing`` share of its values.
+    """
+    rng = np.random.default_rng(seed)
+    dataset = {'id': (np.arange(1, rows + 1), np.zeros(rows, dtype=bool))}
+
+    for index in range(max(columns - 1, 0)):
+        kind = COLUMN_KINDS[index % len(COLUMN_KINDS)]
+        name = f'{kind}_{index // len(COLUMN_KINDS)}'
+        dataset[name] = (_values(rng, kind, rows, cardinality), rng.random(rows) < missing)
+
+    return dataset
+
+def _values(rng, kind, rows, cardinality):
+    if kind == 'numeric':
+        return np.round(rng.normal(5000, 1500, rows), 3)
+    if kind == 'integer':
+        return rng.integers(18, 90, rows)
+    if kind == 'date':
+        days = np.datetime64('2015-01-01') + rng.integers(0, 3650, rows).astype('timedelta64[D]')
+        return days.astype(str).astype(object)
+    if kind == 'categorical':
+        categories = np.array([f'category {code}' for code in range(cardinality)], dtype=object)
+        return categories[rng.zipf(1.5, rows) % cardinality]
+
+    # numbers stored as strings with 2% free text, like hand-entered scores
+    values = rng.integers(0, 1000, rows).astype(str).astype(object)
+    values[rng.random(rows) < 0.02] = 'n/a'
+    return values
+
+def documents(dataset, dataset_id, rows=None, columns=None, chunk_size=10000):
+    """Yield lists of ``{'dataset_id', 'row_index', 'data'}`` documents for the
+    row numbers ``rows`` (every row by default) in that order; missing values
+    are absent from ``data``."""
+    names = list(dataset) if columns is None else [name for name in columns if name in dataset]
+    rows = np.arange(len(dataset['id'][0])) if rows is None else np.asarray(rows, dtype=int)
+
+    for begin in range(0, len(rows), chunk_size):
+        chunk = rows[begin:begin + chunk_size]
+        yield [
+            {'dataset_id': dataset_id, 'row_index': int(row_index), 'data': data}
+            for row_index, data in zip(chunk, _rows(dataset, names, chunk))
+        ]
+
+def _rows(dataset, names, rows):
+    values = [dataset[name][0][rows].tolist() for name in names]
+    missing = [dataset[name][1][rows].tolist() for name in names]
+    for row in range(len(rows)):
+        yield {name: values[column][row] for column, name in enumerate(names) if not missing[column][row]}
@@ -0,0 +1,162 @@
+import os
+import time
+import threading
+from collections import OrderedDict
+import pandas as pd
+from dotenv import load_dotenv
+from compact import compact_column, frame_memory
+
+
+load_dotenv()
+
+class DatasetCache:
+    """LRU cache of loaded datasets bounded by a byte budget.
+
+    Entries are keyed by dataset id and tagged with the dataset version they
+    were loaded at; a lookup with a different version drops the entry. The
+    cache is shared with the analysis worker threads, so every public method
+    holds the lock.
+    """
+
+    def __init__(self, max_bytes, ttl):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = threading.RLock()
+
+    def _entry(self, dataset, version):
+        entry = self._entries.get(dataset)
+        if entry is None:
+            return None
+
+        if entry['version'] != version or entry['expires_at'] < time.monotonic():
+            self.invalidate(dataset)
+            return None
+
+        return entry
+
+    def get(self, dataset, version, columns=None):
+        with self._lock:
+            entry = self._entry(dataset, version)
+            if entry is None or not _covers(entry, columns):
+                self.misses += 1
+                return None
+
+            self.hits += 1
+            self._entries.move_to_end(dataset)
+            df = entry['df']
+            return df.copy(deep=False) if columns is None else select_columns(df, columns)
+
+    def put(self, dataset, version, df, complete=False):
+        with self._lock:
+            if self.max_bytes <= 0:
+                return
+
+            inferences = dict()
+            entry = self._entry(dataset, version)
+            if entry is not None:
+                inferences = entry['inferences']
+                if not complete and len(entry['df']) == len(df):
+                    missing = [col for col in df.columns if col not in entry['df'].columns]
+                    df = pd.concat([entry['df'], df[missing]], axis=1)
+                    complete = entry['complete']
+
+            self.invalidate(dataset)
+            size = int(df.memory_usage(index=True, deep=True).sum())
+            size += sum(_inference_bytes(inferred) for inferred in inferences.values())
+            if size > self.max_bytes:
+                return
+
+            self._entries[dataset] = {
+                'version': version,
+                'df': df,
+                'complete': complete,
+                'inferences': inferences,
+                'bytes': size,
+                'expires_at': time.monotonic() + self.ttl,
+            }
+            self.bytes += size
+            self._evict()
+
+    def get_inference(self, dataset, version, col):
+        with self._lock:
+            entry = self._entry(dataset, version)
+            if entry is None:
+                return None
+            return entry['inferences'].get(col)
+
+    def put_inference(self, dataset, version, col, inferred):
+        with self._lock:
+            entry = self._entry(dataset, version)
+            if entry is None or col in entry['inferences']:
+                return
+
+            size = _inference_bytes(inferred)
+            entry['inferences'][col] = inferred
+
+            compacted = compact_column(entry['df'][col], inferred['type']) if col in entry['df'].columns else None
+            if compacted is not None:
+                size -= int(entry['df'][col].memory_usage(index=False, deep=True)) - int(compacted.memory_usage(index=False, deep=True))
+                # readers may be copying the old frame outside the lock, so swap in a new one
+                df = entry['df'].copy(deep=False)
+                df[col] = compacted
+                entry['df'] = df
+
+            entry['bytes'] += size
+            self.bytes += size
+            self._evict()
+
+    def _evict(self):
+        while self.bytes > self.max_bytes:
+            evicted, entry = self._entries.popitem(last=False)
+            self.bytes -= entry['bytes']
+            self.evictions += 1
+
+    def invalidate(self, dataset):
+        with self._lock:
+            entry = self._entries.pop(dataset, None)
+            if entry is not None:
+                self.bytes -= entry['bytes']
+
+    def memory(self):
+        with self._lock:
+            return [
+                {'dataset': dataset, 'version': entry['version'], 'bytes': entry['bytes'], 'frame': frame_memory(entry['df'])}
+                for dataset, entry in self._entries.items()
+            ]
+
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'bytes': self.bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+            }
+
+def select_columns(df, columns):
+    # a new frame sharing the column arrays, memory-mapped ones included; df[columns] would copy them
+    return pd.DataFrame({col: df[col] for col in dict.fromkeys(columns)}, index=df.index, copy=False)
+
+def _covers(entry, columns):
+    if entry['complete']:
+        return True
+    if columns is None:
+        return False
+    return all(col in entry['df'].columns for col in columns)
+
+def _inference_bytes(inferred):
+    parsed = inferred['parsed']
+    return 0 if parsed is None else int(parsed.memory_usage(index=False, deep=False))
+
+
+dataset_cache = DatasetCache(
+    max_bytes=int(os.getenv("DATASET_CACHE_MAX_BYTES", 512 * 1024 * 1024)),
+    ttl=float(os.getenv("DATASET_CACHE_TTL", 300)),
+)
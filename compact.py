@@ -0,0 +1,48 @@
+import os
+import numpy as np
+import pandas as pd
+from dotenv import load_dotenv
+
+
+load_dotenv()
+
+COMPACT_FRAMES = os.getenv("COMPACT_FRAMES", "true").lower() == "true"
+COMPACT_MAX_CATEGORY_RATIO = float(os.getenv("COMPACT_MAX_CATEGORY_RATIO", 0.5))
+
+# Cached columns are re-encoded once their type is inferred: integer columns
+# are downcast to the narrowest integer dtype holding their range and string
+# columns (categorical or date verdicts) with few distinct values become
+# pandas Categoricals. Both keep the values the analysis sees unchanged; the
+# parsed datetime64/float64 forms already live in the inference memo.
+
+def compact_column(column, d_type):
+    """Return a smaller equivalent of ``column`` or ``None``."""
+    if not COMPACT_FRAMES or not len(column):
+        return None
+
+    if d_type == 'numeric' and pd.api.types.is_integer_dtype(column.dtype) and not isinstance(column.dtype, pd.CategoricalDtype):
+        downcast = pd.to_numeric(column, downcast='integer')
+        return downcast if downcast.dtype.itemsize < column.dtype.itemsize else None
+
+    if d_type in ['categorical', 'date'] and column.dtype == object:
+        present = column.dropna()
+        if not all(type(value) is str for value in present):
+            return None
+        if present.nunique() > COMPACT_MAX_CATEGORY_RATIO * len(column):
+            return None
+        # sorted categories keep sort_index()/sorted() order identical to the strings'
+        categories = np.sort(present.unique().astype(object))
+        return column.astype(pd.CategoricalDtype(categories))
+
+    return None
+
+def frame_memory(df):
+    usage = df.memory_usage(index=False, deep=True)
+    return {
+        'rows': len(df),
+        'bytes': int(usage.sum()),
+        'columns': [
+            {'column': col, 'dtype': str(df[col].dtype), 'bytes': int(usage[col])}
+            for col in df.columns
+        ],
+    }
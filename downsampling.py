@@ -0,0 +1,51 @@
+import os
+import numpy as np
+from dotenv import load_dotenv
+from metrics import timed
+
+
+load_dotenv()
+
+LINE_MAX_POINTS = int(os.getenv("LINE_MAX_POINTS", 0))
+SCATTER_DENSITY_BINS = int(os.getenv("SCATTER_DENSITY_BINS", 50))
+
+@timed('downsample')
+def lttb(x, y, max_points):
+    """Indices of the points Largest-Triangle-Three-Buckets keeps.
+
+    ``x`` must be sorted. The first and last points are always kept and every
+    bucket in between contributes the point forming the largest triangle with
+    the previously kept point and the average of the next bucket. Only the
+    bucket loop runs in Python; the work inside a bucket is vectorized.
+    """
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    n = len(x)
+    if max_points is None or max_points < 3 or n <= max_points:
+        return np.arange(n)
+
+    edges = np.linspace(1, n - 1, max_points - 1).astype(int)
+    sizes = np.diff(edges)
+    # average point of every bucket, the last "bucket" being the last point
+    averages_x = np.append(np.add.reduceat(x[1:n - 1], edges[:-1] - 1) / sizes, x[-1])
+    averages_y = np.append(np.add.reduceat(y[1:n - 1], edges[:-1] - 1) / sizes, y[-1])
+
+    selected = np.empty(max_points, dtype=int)
+    selected[0], selected[-1] = 0, n - 1
+    previous = 0
+    for bucket in range(max_points - 2):
+        start, stop = edges[bucket], edges[bucket + 1]
+        ax, ay = x[previous], y[previous]
+        cx, cy = averages_x[bucket + 1], averages_y[bucket + 1]
+        areas = np.abs((ax - cx) * (y[start:stop] - ay) - (ax - x[start:stop]) * (cy - ay))
+        previous = start + int(np.argmax(areas))
+        selected[bucket + 1] = previous
+    return selected
+
+@timed('grid')
+def density_grid(x, y, x_edges, y_edges):
+    """Point counts on a ``len(x_edges) - 1`` by ``len(y_edges) - 1`` grid as
+    ``[[x_bin, y_bin, count], ...]`` for the non-empty cells."""
+    counts, _, _ = np.histogram2d(x, y, bins=[x_edges, y_edges])
+    x_bins, y_bins = np.nonzero(counts)
+    return np.column_stack([x_bins, y_bins, counts[x_bins, y_bins].astype(int)]).tolist()
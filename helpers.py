@@ -1,7 +1,14 @@
 from math import isnan
-from scipy.stats import gaussian_kde
+from kde import kde
 from numpy import array as np_array
 from numpy import linspace as np_linspace
+from numpy import asarray as np_asarray
+from numpy import isfinite as np_isfinite
+from numpy import round as np_round
+from numpy import trunc as np_trunc
+from numpy import floor as np_floor
+from numpy import errstate as np_errstate
+from numpy import int64 as np_int64
 
 def dd(value):
     print(value)
@@ -24,10 +31,57 @@ def round_float(value):
     except:
         return value
 
-def density_curve(data, cat=None):
+def round_floats(values, exact=False):
+    # vectorized round_float: NaN -> 0, integral -> int, 2 decimals outside [-1, 1].
+    # round() of a numpy float rounds the value scaled by 100 while round() of
+    # a Python float rounds the exact binary value; exact=True matches the latter
+    values = np_asarray(values, dtype=float)
+    values[values != values] = 0
+    # beyond int64 an integral value stays a float rather than wrapping around
+    integral = np_isfinite(values) & (values == np_trunc(values)) & (abs(values) < 2 ** 63)
+    wide = ~integral & ((values < -1) | (values > 1))
+
+    result = values.astype(object)
+    result[integral] = values[integral].astype(int).astype(object)
+    result[wide] = (_round2(values[wide]) if exact else np_round(values[wide], 2)).astype(object)
+    return result
+
+def round_array(values, exact=False):
+    # round_floats kept as an array for the serializer: int64 when every value
+    # is integral, float64 when none is. A column mixing both takes round_floats'
+    # object array, so each value keeps the type round_float would give it
+    values = np_array(values, dtype=float)
+    values[values != values] = 0
+    integral = np_isfinite(values) & (values == np_trunc(values)) & (abs(values) < 2 ** 63)
+    if integral.all():
+        return values.astype(np_int64)
+    if integral.any():
+        return round_floats(values, exact)
+
+    wide = (values < -1) | (values > 1)
+    values[wide] = _round2(values[wide]) if exact else np_round(values[wide], 2)
+    return values
+
+def _round2(values):
+    # halfway products are settled on the exact product (Dekker's two-product)
+    with np_errstate(invalid='ignore', over='ignore'):
+        scaled = values * 100
+        split = values * 134217729.0
+        high = split - (split - values)
+        error = (high * 100 - scaled) + (values - high) * 100
+        tie = np_isfinite(error) & (scaled - np_floor(scaled) == 0.5) & (error != 0)
+    rounded = np_round(scaled)
+    rounded[tie] = np_floor(scaled[tie]) + (error[tie] > 0)
+    return rounded / 100
+
+def density_curve(data, cat=None, weights=None):
 
     density_curve_data = np_array(data)
     density_curve_len = len(density_curve_data)
+    if weights is not None:
+        # weighted points (sketch centroids) standing for sum(weights) values
+        weights = np_asarray(weights, dtype=float)
+        density_curve_len = int(weights.sum()) if len(density_curve_data) > 1 else 0
     if density_curve_len < 2:
         return None
     
@@ -39,10 +93,10 @@ def density_curve(data, cat=None):
     if cat:
         result['name'] = cat
 
+    bw_method = None if weights is None else density_curve_len ** -0.2
     density_curve_len = density_curve_len if density_curve_len < 100 else 100
-    kde = gaussian_kde(density_curve_data)
     result['xAxis'] = np_linspace(min(density_curve_data), max(density_curve_data), density_curve_len)
-    result['data'] = kde(result['xAxis']).tolist()
+    result['data'] = kde(density_curve_data, result['xAxis'], weights, bw_method).tolist()
     
     result['xAxis'] = result['xAxis'].tolist()
     
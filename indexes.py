@@ -0,0 +1,74 @@
+import os
+import asyncio
+from collections import Counter
+from pymongo.errors import PyMongoError
+from dotenv import load_dotenv
+from mongo import get_collection
+from profiles import PROFILE_COLLECTION_NAME
+
+
+load_dotenv()
+
+MANAGE_INDEXES = os.getenv("MANAGE_INDEXES", "true").lower() == "true"
+CHART_INDEX_MIN_REQUESTS = int(os.getenv("CHART_INDEX_MIN_REQUESTS", 3))
+CHART_INDEX_MAX_FIELDS = int(os.getenv("CHART_INDEX_MAX_FIELDS", 16))
+
+INDEX_PREFIX = 'chart_'
+
+class IndexManager:
+    """Indexes of data_entries kept by the service.
+
+    ``(dataset_id, row_index)`` backs every ordered scan and
+    ``(dataset_id, column)`` the column profiles. A field charted in
+    windowed line/scatter requests CHART_INDEX_MIN_REQUESTS times gets
+    ``(dataset_id, data.<field>, row_index)``, up to CHART_INDEX_MAX_FIELDS
+    such indexes, built in the background.
+    """
+
+    def __init__(self):
+        self.requests = Counter()
+        self.fields = set()
+        self.failed = set()
+        self._building = dict()
+
+    async def ensure(self):
+        if not MANAGE_INDEXES:
+            return
+        collection = get_collection()
+        try:
+            await collection.create_index([('dataset_id', 1), ('row_index', 1)])
+            await get_collection(PROFILE_COLLECTION_NAME).create_index([('dataset_id', 1), ('column', 1)])
+            for name, index in (await collection.index_information()).items():
+                if name.startswith(INDEX_PREFIX):
+                    self.fields.add(index['key'][1][0][len('data.'):])
+        except PyMongoError:
+            # e.g. an equivalent index under another name; queries work without ours
+            pass
+
+    def note(self, field):
+        if not MANAGE_INDEXES or field in self.fields or field in self.failed or field in self._building:
+            return
+        self.requests[field] += 1
+        if self.requests[field] >= CHART_INDEX_MIN_REQUESTS and len(self.fields) + len(self._building) < CHART_INDEX_MAX_FIELDS:
+            self._building[field] = asyncio.ensure_future(self._create(field))
+
+    async def _create(self, field):
+        try:
+            await get_collection().create_index([('dataset_id', 1), (f'data.{field}', 1), ('row_index', 1)], name=f'{INDEX_PREFIX}{field}')
+            self.fields.add(field)
+        except PyMongoError:
+            self.failed.add(field)
+        finally:
+            del self._building[field]
+
+    def stats(self):
+        return {
+            'enabled': MANAGE_INDEXES,
+            'fields': sorted(self.fields),
+            'building': sorted(self._building),
+            'failed': sorted(self.failed),
+            'requests': dict(self.requests),
+        }
+
+
+index_manager = IndexManager()
@@ -0,0 +1,93 @@
+import os
+import pandas as pd
+from dotenv import load_dotenv
+from metrics import timed
+
+
+load_dotenv()
+
+TYPE_INFERENCE_SAMPLE_SIZE = int(os.getenv("TYPE_INFERENCE_SAMPLE_SIZE", 0))
+
+@timed('parse')
+def infer_column(column, sample_size=TYPE_INFERENCE_SAMPLE_SIZE):
+    """Classify a raw column as numeric, date or categorical.
+
+    Returns ``{'type', 'parsed', 'numeric_distinct'}``. ``numeric_distinct`` is
+    ``len(pd.to_numeric(column, errors='coerce').unique())`` when the numeric
+    parse was needed for the verdict, otherwise ``None``.
+
+    With ``sample_size`` the verdict is taken from a bounded random sample and
+    then confirmed on the full column by only the parser of that verdict;
+    an unconfirmed verdict falls back to full inference.
+    """
+    missing = int(column.isna().sum())
+
+    if 0 < sample_size < len(column):
+        sample = column.sample(sample_size, random_state=0)
+        verdict = _infer(sample, int(sample.isna().sum()))['type']
+        inferred = _confirm(column, missing, verdict)
+        if inferred is not None:
+            return inferred
+
+    return _infer(column, missing)
+
+def _infer(column, missing):
+    inferred = _numeric(column, missing)
+    if inferred['type'] is not None:
+        return inferred
+
+    numeric_distinct = inferred['numeric_distinct']
+    all_numeric = inferred['all_numeric']
+
+    inferred = _date(column, missing)
+    if inferred['type'] is None:
+        inferred = _numeric_or_categorical(column, all_numeric)
+    inferred['numeric_distinct'] = numeric_distinct
+    return inferred
+
+def _confirm(column, missing, verdict):
+    if verdict == 'numeric':
+        inferred = _numeric(column, missing)
+        return inferred if inferred['type'] == 'numeric' else None
+
+    if verdict == 'date':
+        inferred = _date(column, missing)
+        # the numeric parse is skipped, so _numeric_distinct counts it if needed
+        inferred['numeric_distinct'] = None
+        return inferred if inferred['type'] == 'date' else None
+
+    inferred = _numeric(column, missing)
+    if inferred['type'] is not None:
+        return None
+    categorical = _numeric_or_categorical(column, inferred['all_numeric'])
+    categorical['numeric_distinct'] = inferred['numeric_distinct']
+    return categorical if categorical['type'] == 'categorical' else None
+
+def _numeric(column, missing):
+    parsed = pd.to_numeric(column, errors='coerce')
+    parsed_missing = int(parsed.isna().sum())
+    numerator = len(parsed) - parsed_missing
+    denominator = missing if missing > 0 else 1
+    unique = parsed.dropna().nunique()
+
+    d_type = 'numeric' if (numerator / denominator) > 0.1 and unique > 10 else None
+    return {
+        'type': d_type,
+        'parsed': parsed if d_type else None,
+        'numeric_distinct': unique + (1 if parsed_missing else 0),
+        # pd.to_numeric(errors='raise') would have succeeded
+        'all_numeric': parsed_missing == missing,
+    }
+
+def _date(column, missing):
+    parsed = pd.to_datetime(column, format='%Y-%m-%d', errors='coerce')
+    numerator = parsed.notna().sum()
+    denominator = missing if missing > 0 else 1
+
+    d_type = 'date' if (numerator / denominator) > 0.1 or parsed.dropna().nunique() > 10 else None
+    return {'type': d_type, 'parsed': parsed if d_type else None}
+
+def _numeric_or_categorical(column, all_numeric):
+    if column.dropna().nunique() > 10 and all_numeric:
+        return {'type': 'numeric', 'parsed': column}
+    return {'type': 'categorical', 'parsed': column}
@@ -0,0 +1,51 @@
+import os
+import numpy as np
+from dotenv import load_dotenv
+from scipy.signal import fftconvolve
+from scipy.stats import gaussian_kde
+from metrics import timed
+
+
+load_dotenv()
+
+KDE_GRID_SIZE = int(os.getenv("KDE_GRID_SIZE", 2048))
+KDE_EXACT_MAX_ROWS = int(os.getenv("KDE_EXACT_MAX_ROWS", 2000))
+KDE_MAX_GRID_SIZE = 1 << 18
+
+@timed('kde')
+def kde(data, points, weights=None, bw_method=None):
+    """Evaluate the Gaussian KDE of ``data`` at the evenly spaced ``points``.
+
+    The bandwidth is gaussian_kde's (Scott by default, Silverman or a scalar
+    factor through ``bw_method``). Up to KDE_EXACT_MAX_ROWS values the kernel
+    sum is evaluated exactly; above that the values are linearly binned onto
+    a grid of at least KDE_GRID_SIZE nodes, with a spacing of at most a
+    quarter bandwidth, and convolved with the kernel by FFT. The binned curve
+    stays within 1% of the exact one relative to its peak.
+    """
+    data = np.asarray(data, dtype=float)
+    points = np.asarray(points, dtype=float)
+    estimator = gaussian_kde(data, bw_method=bw_method, weights=weights)
+    if len(data) <= KDE_EXACT_MAX_ROWS or len(points) < 2:
+        return estimator(points)
+
+    bandwidth = float(np.sqrt(estimator.covariance[0, 0]))
+    low, high = points[0], points[-1]
+    # grid nodes fall on every evaluation point, so no interpolation is needed
+    step = max(int(np.ceil((KDE_GRID_SIZE - 1) / (len(points) - 1))), int(np.ceil(4 * (high - low) / bandwidth / (len(points) - 1))))
+    size = step * (len(points) - 1) + 1
+    if size > KDE_MAX_GRID_SIZE or data.min() < low or data.max() > high:
+        return estimator(points)
+
+    delta = (high - low) / (size - 1)
+    position = (data - low) / delta
+    index = np.minimum(position.astype(int), size - 2)
+    fraction = position - index
+    weights = estimator.weights
+    counts = np.bincount(index, weights * (1 - fraction), size) + np.bincount(index + 1, weights * fraction, size)
+
+    reach = min(size - 1, int(np.ceil(5 * bandwidth / delta)))
+    offsets = np.arange(-reach, reach + 1) * delta
+    kernel = np.exp(-0.5 * (offsets / bandwidth) ** 2) / (bandwidth * np.sqrt(2 * np.pi))
+    curve = fftconvolve(counts, kernel, mode='same')
+    return np.maximum(curve[::step], 0)
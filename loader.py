@@ -0,0 +1,194 @@
+import os
+import time
+import asyncio
+import numpy as np
+import pandas as pd
+from dotenv import load_dotenv
+from mongo import get_collection
+from cache import dataset_cache
+from singleflight import dataset_loads
+from snapshots import snapshot_store
+from metrics import stage, timed, fetched
+
+
+load_dotenv()
+
+STREAM_BATCH_SIZE = int(os.getenv("STREAM_BATCH_SIZE", 50000))
+
+SAMPLE_LOOKUP_SIZE = 1000
+
+VERSION_RECOUNT_INTERVAL = float(os.getenv("VERSION_RECOUNT_INTERVAL", 60))
+
+# dataset -> (rows, last row_index, counted at) of its last count
+_counts = dict()
+
+async def get_dataframe_from_mongo(query={}, columns=None):
+    collection = get_collection()
+    if columns is not None:
+        columns = list(dict.fromkeys(columns))
+
+    cursor = collection.find(query, _projection(columns)).sort({ 'row_index': 1 })
+    with stage('mongo'):
+        records = [doc['data'] async for doc in cursor if 'data' in doc]
+
+    with stage('frame'):
+        df = _frame(records, columns)
+    _fetched(df)
+    return df
+
+async def iter_dataframes(query={}, columns=None, batch_size=STREAM_BATCH_SIZE):
+    # yields the rows in row_index order as DataFrames of at most batch_size rows
+    collection = get_collection()
+    if columns is not None:
+        columns = list(dict.fromkeys(columns))
+
+    cursor = collection.find(query, _projection(columns)).sort({ 'row_index': 1 }).batch_size(min(batch_size, 10000))
+    records = []
+    async for doc in cursor:
+        if 'data' in doc:
+            records.append(doc['data'])
+        if len(records) >= batch_size:
+            yield _fetched(_frame(records, columns))
+            records = []
+
+    if records:
+        yield _fetched(_frame(records, columns))
+
+async def sample_dataframe_from_mongo(dataset, size, version, deadline=None):
+    # a uniform random sample of at most size rows, in row_index order. Random
+    # row_index values are looked up SAMPLE_LOOKUP_SIZE at a time through the
+    # (dataset_id, row_index) index, drawing extra values to make up for gaps
+    # in row_index; $sample after a $match would scan every row of the
+    # dataset on the server. The lookups go in random order, so stopping at
+    # deadline (time.monotonic()) still leaves a uniform sample, only a
+    # smaller one
+    rows, last_row_index = version
+    collection = get_collection()
+    query = {'dataset_id': {'$eq': dataset}}
+    first = await collection.find_one(query, {'row_index': 1, '_id': 0}, sort=[('row_index', 1)])
+
+    rng = np.random.default_rng()
+    docs = []
+    if first is not None and rows:
+        span = last_row_index - first['row_index'] + 1
+        candidates = first['row_index'] + rng.choice(span, min(span, -(-size * span // rows)), replace=False)
+        with stage('mongo'):
+            for start in range(0, len(candidates), SAMPLE_LOOKUP_SIZE):
+                lookup = {**query, 'row_index': {'$in': [int(row_index) for row_index in candidates[start:start + SAMPLE_LOOKUP_SIZE]]}}
+                docs += [doc async for doc in collection.find(lookup, {'row_index': 1, 'data': 1, '_id': 0}) if 'data' in doc]
+                if deadline is not None and time.monotonic() > deadline:
+                    break
+
+    if len(docs) > size:
+        docs = [docs[index] for index in rng.choice(len(docs), size, replace=False)]
+    docs.sort(key=lambda doc: doc.get('row_index', 0))
+    with stage('frame'):
+        df = _frame([doc['data'] for doc in docs], None)
+    return _fetched(df)
+
+async def get_window_from_mongo(query, columns, field, limit=None):
+    """Rows matching ``query`` ordered by (data.<field>, row_index), at most
+    ``limit`` of them. Returns ``(df, last)`` where ``last`` is the
+    ``(field value, row_index)`` of the final row when more rows follow."""
+    collection = get_collection()
+    columns = list(dict.fromkeys([field] + columns))
+    projection = _projection(columns)
+    projection['row_index'] = 1
+    cursor = collection.find(query, projection).sort([(f'data.{field}', 1), ('row_index', 1)])
+    if limit is not None:
+        cursor = cursor.limit(limit + 1)
+    with stage('mongo'):
+        docs = [doc async for doc in cursor if 'data' in doc]
+
+    last = None
+    if limit is not None and len(docs) > limit:
+        docs = docs[:limit]
+        last = (docs[-1]['data'][field], docs[-1]['row_index'])
+
+    with stage('frame'):
+        df = _frame([doc['data'] for doc in docs], columns)
+    return _fetched(df), last
+
+def _projection(columns):
+    if columns is None:
+        return None
+    projection = {f'data.{col}': 1 for col in columns}
+    projection['_id'] = 0
+    return projection
+
+def _frame(records, columns):
+    if columns is not None:
+        return pd.DataFrame(records, columns=columns)
+    return pd.DataFrame(records)
+
+def _fetched(df):
+    fetched(len(df), int(df.memory_usage(index=False).sum()))
+    return df
+
+def _select(df, columns):
+    # like a projection: a field no document has becomes an all-NaN column
+    columns = list(dict.fromkeys(columns))
+    return pd.DataFrame({col: df[col] if col in df.columns else pd.Series(np.nan, index=df.index) for col in columns}, columns=columns, copy=False)
+
+@timed('version')
+async def get_dataset_version(dataset):
+    """Return ``(rows, last row_index)`` of a dataset.
+
+    The last row_index is an indexed lookup on every call. Counting is
+    O(rows) on the server, so the count is reused while the last row_index
+    is unchanged, for at most VERSION_RECOUNT_INTERVAL seconds: appends
+    change the version at once, rows deleted from before the end only once
+    the interval has passed.
+    """
+    collection = get_collection()
+    query = {"dataset_id":{"$eq":dataset}}
+
+    last = await collection.find_one(query, {'row_index': 1, '_id': 0}, sort=[('row_index', -1)])
+    last = (last or {}).get('row_index')
+
+    counted = _counts.get(dataset)
+    if counted is not None and counted[1] == last and time.monotonic() - counted[2] < VERSION_RECOUNT_INTERVAL:
+        return counted[0], last
+
+    count = await collection.count_documents(query)
+    _counts[dataset] = (count, last, time.monotonic())
+    return count, last
+
+async def dataset_version(dataset):
+    # concurrent version checks of one dataset share a single round trip
+    dataset = int(dataset)
+    return await dataset_loads.do(('version', dataset), get_dataset_version, dataset)
+
+async def load_dataset(dataset, columns=None, version=None):
+    dataset = int(dataset)
+    if version is None:
+        version = await dataset_version(dataset)
+
+    df = dataset_cache.get(dataset, version, columns)
+    if df is not None:
+        return df, version
+
+    # concurrent loads of the same columns share one scan. Each caller gets its
+    # own frame over shared (possibly memory-mapped) column arrays: analyses
+    # replace columns, they never write into them
+    key = ('rows', dataset, version, None if columns is None else tuple(dict.fromkeys(columns)))
+    df = await dataset_loads.do(key, _fetch_dataset, dataset, version, columns)
+    return df.copy(deep=False), version
+
+async def _fetch_dataset(dataset, version, columns=None):
+    if not snapshot_store.enabled():
+        df = await get_dataframe_from_mongo({"dataset_id":{"$eq":dataset}}, columns)
+        dataset_cache.put(dataset, version, df, complete=columns is None)
+        return df
+
+    # snapshots always hold every column; the requested ones are memory-mapped from it
+    with stage('snapshot'):
+        df = await asyncio.to_thread(snapshot_store.load, dataset, version, columns)
+    if df is None:
+        full = await get_dataframe_from_mongo({"dataset_id":{"$eq":dataset}})
+        await asyncio.to_thread(snapshot_store.save, dataset, version, full)
+        df = full if columns is None else _select(full, columns)
+    else:
+        _fetched(df)
+    dataset_cache.put(dataset, version, df, complete=columns is None)
+    return df
@@ -1,26 +1,152 @@
-from fastapi import FastAPI
-from analyser import extract, line, histogram, bar
+import json
+import time
+import asyncio
+from functools import partial
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Body, Request, Response
+from fastapi.responses import JSONResponse, PlainTextResponse
+import mongo
+import workers
+import metrics
+from profiler import profiler
+from cache import dataset_cache
+from singleflight import dataset_loads, chart_requests
+from snapshots import snapshot_store
+from results import result_cache, result_key
+from serialization import FastJSONResponse
+from loader import dataset_version
+from indexes import index_manager
+from Exceptions import AnalysisBusyException, AnalysisTimeoutException, InvalidCursorException
+from analyser import extract, line, scatter, histogram, bar, batch
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app):
+    mongo.connect()
+    workers.start()
+    profiler.start()
+    # may take a while on a large collection; requests do not wait for it
+    index_build = asyncio.ensure_future(index_manager.ensure())
+    yield
+    index_build.cancel()
+    profiler.stop()
+    workers.shutdown()
+    mongo.close()
+
+app = FastAPI(lifespan=lifespan)
+
+@app.middleware('http')
+async def timing(request, call_next):
+    timing = metrics.begin()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+    finally:
+        end = time.perf_counter()
+        route = request.scope.get('route')
+        endpoint = route.path if route is not None else 'unmatched'
+        metrics.record(timing, endpoint, request.method, status, end - timing.start)
+        profiler.capture(timing.start, end, endpoint, str(request.url))
+
+    response.headers['Server-Timing'] = timing.header(end - timing.start)
+    return response
+
+@app.exception_handler(AnalysisBusyException)
+async def analysis_busy(request, exception):
+    return JSONResponse(status_code=429, content={'message': str(exception)}, headers={'Retry-After': str(workers.ANALYSIS_RETRY_AFTER)})
+
+@app.exception_handler(InvalidCursorException)
+async def invalid_cursor(request, exception):
+    return JSONResponse(status_code=400, content={'message': str(exception)})
+
+@app.exception_handler(AnalysisTimeoutException)
+async def analysis_timeout(request, exception):
+    return JSONResponse(status_code=503, content={'message': str(exception)}, headers={'Retry-After': str(workers.ANALYSIS_RETRY_AFTER)})
+
+async def _cached(request, kind, function, dataset, *args):
+    # results are keyed by their parameters and the dataset version: a repeat
+    # costs one version check, a client holding the ETag gets a bodiless 304
+    version = await dataset_version(dataset)
+    etag = f'"{result_key(kind, dataset, version, dict(enumerate(args)))}"'
+    if etag in _etags(request.headers.get('if-none-match')):
+        return Response(status_code=304, headers={'ETag': etag})
+
+    result = result_cache.get(etag)
+    if result is None:
+        # the version the ETag names is the one the analysis loads
+        result = await chart_requests.do(etag, partial(function, version=version), dataset, *args)
+        result_cache.put(etag, result)
+    return FastJSONResponse(result, headers={'ETag': etag})
+
+def _etags(header):
+    if not header:
+        return []
+    return [tag.strip().removeprefix('W/') for tag in header.split(',')]
 
 @app.get('/dataset/extract-metadata/{dataset}')
-async def extract_metadata(dataset, replace_missing_values=False):
-    return extract(dataset, replace_missing_values)
+async def extract_metadata(request: Request, dataset, replace_missing_values=False, incremental=None, execution=None, approximate=None, sample_size=None, time_budget=None):
+    return await _cached(request, 'extract', extract, dataset, replace_missing_values, incremental, execution, approximate, sample_size, time_budget)
 
 @app.get('/dataset/line-chart/{dataset}')
-async def line_chart(dataset, independent_variable, dependent_variable, category_variable=None):
-    return line(dataset, independent_variable, dependent_variable, category_variable)
+async def line_chart(request: Request, dataset, independent_variable, dependent_variable, category_variable=None, max_points=None, layout='pairs', x_min=None, x_max=None, limit=None, after=None):
+    return await _cached(request, 'line', line, dataset, independent_variable, dependent_variable, category_variable, max_points, layout, x_min, x_max, limit, after)
 
 @app.get('/dataset/scatter-chart/{dataset}')
-async def scatter_chart(dataset, independent_variable, dependent_variable, category_variable=None):
-    return line(dataset, independent_variable, dependent_variable, category_variable)
+async def scatter_chart(request: Request, dataset, independent_variable, dependent_variable, category_variable=None, mode='points', bins=None, layout='pairs', x_min=None, x_max=None, limit=None, after=None):
+    return await _cached(request, 'scatter', scatter, dataset, independent_variable, dependent_variable, category_variable, mode, bins, layout, x_min, x_max, limit, after)
 
 @app.get('/dataset/histogram-chart/{dataset}')
-async def histogram_chart(dataset, independent_variable,  category_variable=None, statistic='count'):
-    return histogram(dataset, independent_variable, category_variable, statistic)
+async def histogram_chart(request: Request, dataset, independent_variable,  category_variable=None, statistic='count', execution=None):
+    return await _cached(request, 'histogram', histogram, dataset, independent_variable, category_variable, statistic, execution)
 
 @app.get('/dataset/bar-chart/{dataset}')
-async def bar_chart(dataset, independent_variable,  category_variable=None, statistic='frequency'): 
-    return bar(dataset, independent_variable, category_variable, statistic)
+async def bar_chart(request: Request, dataset, independent_variable,  category_variable=None, statistic='frequency', execution=None): 
+    return await _cached(request, 'bar', bar, dataset, independent_variable, category_variable, statistic, execution)
+
+@app.post('/dataset/batch/{dataset}')
+async def batch_charts(dataset, charts: list = Body(embed=True)):
+    return FastJSONResponse(await chart_requests.do(('batch', dataset, json.dumps(charts, sort_keys=True, default=str)), batch, dataset, charts))
+
+@app.get('/cache/stats')
+async def cache_stats():
+    return dataset_cache.stats()
+
+@app.get('/cache/datasets')
+async def cache_datasets():
+    return dataset_cache.memory()
+
+@app.get('/snapshots/stats')
+async def snapshots_stats():
+    return snapshot_store.stats()
+
+@app.get('/results/stats')
+async def results_stats():
+    return result_cache.stats()
+
+@app.get('/metrics')
+async def prometheus_metrics():
+    gauges = {
+        'analyser_process_peak_rss_bytes': ('Peak resident set size of the process.', metrics.peak_rss()),
+        'analyser_analyses_pending': ('Analyses running or queued.', workers.stats()['pending']),
+        'analyser_dataset_cache_bytes': ('Bytes held by the dataset cache.', dataset_cache.stats()['bytes']),
+    }
+    return PlainTextResponse(metrics.registry.render(gauges), media_type='text/plain; version=0.0.4')
+
+@app.get('/profiles')
+async def slow_request_profiles():
+    return profiler.stats()
+
+@app.get('/indexes/stats')
+async def indexes_stats():
+    return index_manager.stats()
 
+@app.get('/workers/stats')
+async def workers_stats():
+    return workers.stats()
 
+@app.get('/singleflight/stats')
+async def singleflight_stats():
+    return {
+        'dataset_loads': dataset_loads.stats(),
+        'chart_requests': chart_requests.stats(),
+    }
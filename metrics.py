@@ -0,0 +1,172 @@
+import os
+import time
+import asyncio
+import resource
+import functools
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dotenv import load_dotenv
+
+
+load_dotenv()
+
+METRICS = os.getenv("METRICS", "true").lower() == "true"
+METRICS_BUCKETS = [float(bucket) for bucket in os.getenv("METRICS_BUCKETS", "0.005,0.01,0.025,0.05,0.1,0.25,0.5,1,2.5,5,10,30").split(',')]
+
+# Each request carries a Timing in its context. Stages (version check, Mongo
+# fetch, frame build, type inference, binning, KDE, downsampling, analysis,
+# serialization) add their durations to it, including from the thread
+# executor, which runs analyses in a copy of the caller's context. Stages may
+# nest, e.g. kde inside bin inside analysis. The stages go out per request as
+# a Server-Timing header and are aggregated into the histograms of /metrics.
+
+_current = ContextVar('timing', default=None)
+
+class Timing:
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.stages = dict()
+        self.rows = 0
+        self.bytes = 0
+        self.peak_rss = peak_rss()
+        self._lock = threading.Lock()
+
+    def add(self, name, seconds):
+        with self._lock:
+            self.stages[name] = self.stages.get(name, 0.0) + seconds
+
+    def fetched(self, rows, size):
+        with self._lock:
+            self.rows += rows
+            self.bytes += size
+
+    def header(self, total):
+        stages = [f'{name};dur={seconds * 1000:.1f}' for name, seconds in self.stages.items()]
+        return ', '.join(stages + [f'total;dur={total * 1000:.1f}'])
+
+def begin():
+    timing = Timing()
+    _current.set(timing)
+    return timing
+
+@contextmanager
+def stage(name):
+    timing = _current.get()
+    if timing is None:
+        yield
+        return
+
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timing.add(name, time.perf_counter() - start)
+
+def timed(name):
+    # decorator form of stage() for plain and async functions
+    def decorator(function):
+        if asyncio.iscoroutinefunction(function):
+            @functools.wraps(function)
+            async def wrapper(*args, **kwargs):
+                with stage(name):
+                    return await function(*args, **kwargs)
+        else:
+            @functools.wraps(function)
+            def wrapper(*args, **kwargs):
+                with stage(name):
+                    return function(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def fetched(rows, size):
+    timing = _current.get()
+    if timing is not None:
+        timing.fetched(rows, size)
+
+def peak_rss():
+    # ru_maxrss is in kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+class Registry:
+    """Prometheus counters, gauges and histograms in the text exposition format."""
+
+    def __init__(self, buckets):
+        self.buckets = sorted(buckets)
+        self._metrics = dict()
+        self._lock = threading.Lock()
+
+    def _series(self, name, kind, help_text):
+        if name not in self._metrics:
+            self._metrics[name] = {'kind': kind, 'help': help_text, 'series': dict()}
+        return self._metrics[name]['series']
+
+    def inc(self, name, labels, value=1, help_text=''):
+        with self._lock:
+            series = self._series(name, 'counter', help_text)
+            key = tuple(sorted(labels.items()))
+            series[key] = series.get(key, 0) + value
+
+    def set_max(self, name, labels, value, help_text=''):
+        with self._lock:
+            series = self._series(name, 'gauge', help_text)
+            key = tuple(sorted(labels.items()))
+            series[key] = max(series.get(key, value), value)
+
+    def observe(self, name, labels, value, help_text=''):
+        with self._lock:
+            series = self._series(name, 'histogram', help_text)
+            key = tuple(sorted(labels.items()))
+            if key not in series:
+                series[key] = {'buckets': [0] * len(self.buckets), 'sum': 0.0, 'count': 0}
+            histogram = series[key]
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    histogram['buckets'][index] += 1
+            histogram['sum'] += value
+            histogram['count'] += 1
+
+    def render(self, gauges=None):
+        lines = []
+        with self._lock:
+            for name, metric in self._metrics.items():
+                lines.append(f'# HELP {name} {metric["help"]}')
+                lines.append(f'# TYPE {name} {metric["kind"]}')
+                for key, value in metric['series'].items():
+                    if metric['kind'] != 'histogram':
+                        lines.append(f'{name}{_labels(key)} {_number(value)}')
+                        continue
+                    for bound, count in zip(self.buckets, value['buckets']):
+                        lines.append(f'{name}_bucket{_labels(key + (("le", f"{bound:g}"),))} {count}')
+                    lines.append(f'{name}_bucket{_labels(key + (("le", "+Inf"),))} {value["count"]}')
+                    lines.append(f'{name}_sum{_labels(key)} {_number(value["sum"])}')
+                    lines.append(f'{name}_count{_labels(key)} {value["count"]}')
+
+        for name, (help_text, value) in (gauges or dict()).items():
+            lines += [f'# HELP {name} {help_text}', f'# TYPE {name} gauge', f'{name} {_number(value)}']
+        return '\n'.join(lines) + '\n'
+
+def _number(value):
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+def _labels(key):
+    if not key:
+        return ''
+    escaped = [(name, str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')) for name, value in key]
+    return '{' + ','.join(f'{name}="{value}"' for name, value in escaped) + '}'
+
+def record(timing, endpoint, method, status, total):
+    if not METRICS:
+        return
+    labels = {'endpoint': endpoint, 'method': method}
+    registry.inc('analyser_requests_total', dict(labels, status=str(status)), help_text='Requests by endpoint and status.')
+    registry.observe('analyser_request_duration_seconds', labels, total, help_text='Request latency.')
+    for name, seconds in timing.stages.items():
+        registry.observe('analyser_stage_duration_seconds', dict(labels, stage=name), seconds, help_text='Time per request spent in each stage.')
+    registry.inc('analyser_fetched_rows_total', labels, timing.rows, help_text='Rows read from MongoDB or snapshots.')
+    registry.inc('analyser_fetched_bytes_total', labels, timing.bytes, help_text='Shallow in-memory size of the frames built from fetched rows.')
+    registry.set_max('analyser_peak_rss_growth_bytes', labels, peak_rss() - timing.peak_rss, help_text='Largest rise of the process peak RSS during one request.')
+
+
+registry = Registry(METRICS_BUCKETS)
@@ -0,0 +1,30 @@
+import os
+from dotenv import load_dotenv
+from motor.motor_asyncio import AsyncIOMotorClient
+
+
+load_dotenv()
+
+_client = None
+
+def connect():
+    global _client
+    if _client is None:
+        _client = AsyncIOMotorClient(
+            os.getenv("MONGO_URI"),
+            maxPoolSize=int(os.getenv("MONGO_MAX_POOL_SIZE", 100)),
+            minPoolSize=int(os.getenv("MONGO_MIN_POOL_SIZE", 0)),
+            maxIdleTimeMS=int(os.getenv("MONGO_MAX_IDLE_TIME_MS", 60000)),
+            waitQueueTimeoutMS=int(os.getenv("MONGO_WAIT_QUEUE_TIMEOUT_MS", 10000)),
+        )
+    return _client
+
+def close():
+    global _client
+    if _client is not None:
+        _client.close()
+        _client = None
+
+def get_collection(name=None):
+    db = connect()[os.getenv("DB_NAME")]
+    return db[name or os.getenv("COLLECTION_NAME")]
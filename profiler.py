@@ -0,0 +1,105 @@
+import os
+import sys
+import time
+import threading
+from collections import deque, Counter
+from dotenv import load_dotenv
+
+
+load_dotenv()
+
+PROFILE_SLOW_SECONDS = float(os.getenv("PROFILE_SLOW_SECONDS", 0))
+PROFILE_INTERVAL = float(os.getenv("PROFILE_INTERVAL", 0.01))
+PROFILE_WINDOW = float(os.getenv("PROFILE_WINDOW", 60))
+PROFILE_KEEP = int(os.getenv("PROFILE_KEEP", 20))
+PROFILE_DIR = os.getenv("PROFILE_DIR", "")
+
+# Idle threads (the event loop waiting in select, pool workers waiting for
+# work) are left out of the samples.
+IDLE_FILES = ['selectors.py', 'threading.py', 'queue.py', 'thread.py']
+
+class SamplingProfiler:
+    """Samples the stack of every thread each ``interval`` seconds.
+
+    Samples of the last ``window`` seconds are kept; when a request takes
+    longer than ``slow`` seconds the samples taken while it ran are folded
+    into ``thread;file:function;...`` stacks with counts (the input format of
+    flamegraph.pl and speedscope). The samples cover the whole process, so a
+    profile also shows whatever ran concurrently with the slow request.
+    """
+
+    def __init__(self, slow, interval, window, keep, directory):
+        self.slow = slow
+        self.interval = interval
+        self.directory = directory
+        self.profiles = deque(maxlen=keep)
+        self._samples = deque(maxlen=max(1, int(window / interval)))
+        self._thread = None
+        self._stopped = threading.Event()
+
+    def enabled(self):
+        return self.slow > 0 and self.interval > 0
+
+    def start(self):
+        if not self.enabled() or self._thread is not None:
+            return
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._run, name='profiler', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        if self._thread is not None:
+            self._stopped.set()
+            self._thread.join()
+            self._thread = None
+
+    def _run(self):
+        own = threading.get_ident()
+        while not self._stopped.wait(self.interval):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            stacks = [
+                _fold(names.get(ident, str(ident)), frame)
+                for ident, frame in sys._current_frames().items()
+                if ident != own and os.path.basename(frame.f_code.co_filename) not in IDLE_FILES
+            ]
+            self._samples.append((time.perf_counter(), stacks))
+
+    def capture(self, start, end, endpoint, url):
+        if not self.enabled() or end - start < self.slow:
+            return None
+
+        stacks = Counter(stack for taken, sampled in list(self._samples) if start <= taken <= end for stack in sampled)
+        profile = {
+            'endpoint': endpoint,
+            'url': url,
+            'duration': end - start,
+            'at': time.time(),
+            'samples': sum(stacks.values()),
+            'stacks': [f'{stack} {count}' for stack, count in stacks.most_common()],
+        }
+        self.profiles.append(profile)
+
+        if self.directory:
+            os.makedirs(self.directory, exist_ok=True)
+            name = f'{int(profile["at"] * 1000)}-{endpoint.strip("/").replace("/", "_").replace("{", "").replace("}", "")}.folded'
+            with open(os.path.join(self.directory, name), 'w') as file:
+                file.write('\n'.join(profile['stacks']) + '\n')
+        return profile
+
+    def stats(self):
+        return {
+            'enabled': self.enabled(),
+            'slow_seconds': self.slow,
+            'interval': self.interval,
+            'profiles': list(self.profiles),
+        }
+
+def _fold(thread_name, frame):
+    calls = []
+    while frame is not None:
+        calls.append(f'{os.path.basename(frame.f_code.co_filename)}:{frame.f_code.co_name}')
+        frame = frame.f_back
+    return ';'.join([thread_name] + calls[::-1])
+
+
+profiler = SamplingProfiler(PROFILE_SLOW_SECONDS, PROFILE_INTERVAL, PROFILE_WINDOW, PROFILE_KEEP, PROFILE_DIR)
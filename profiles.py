@@ -0,0 +1,389 @@
+import os
+from math import sqrt
+import numpy as np
+import pandas as pd
+from dotenv import load_dotenv
+from pymongo import ReplaceOne
+from mongo import get_collection
+from loader import get_dataframe_from_mongo, get_dataset_version
+from helpers import round_float
+from sketch import new_sketch, sketch_update, sketch_median, sketch_histogram
+from metrics import timed
+from workers import run_analysis
+
+
+load_dotenv()
+
+EXTRACT_FROM_PROFILES = os.getenv("EXTRACT_FROM_PROFILES", "false").lower() == "true"
+PROFILE_COLLECTION_NAME = os.getenv("PROFILE_COLLECTION_NAME", "column_profiles")
+PROFILE_MAX_CATEGORIES = int(os.getenv("PROFILE_MAX_CATEGORIES", 1000))
+
+# Persisted per-column profile state for append-only datasets. Each refresh
+# folds only the rows with a row_index above the last one profiled into the
+# counters, Welford moments, capped distinct sets, category tables and
+# quantile sketches, so extract-metadata costs O(new rows). Each column's
+# state is its own document, keyed by (dataset_id, column), so a wide
+# dataset stays clear of the 16MB document limit.
+
+def use_profiles(incremental):
+    if incremental is None:
+        return EXTRACT_FROM_PROFILES
+    return str(incremental).lower() in ['true', '1']
+
+def new_profile(dataset):
+    return {
+        'dataset_id': dataset,
+        'rows': 0,
+        'last_row_index': None,
+        'columns': [],
+    }
+
+@timed('profile')
+async def refresh_profile(dataset, version=None):
+    dataset = int(dataset)
+    collection = get_collection(PROFILE_COLLECTION_NAME)
+
+    profile = await _load_profile(collection, dataset)
+    count, last_row_index = version if version is not None else await get_dataset_version(dataset)
+    if profile is not None and (profile['rows'], profile['last_row_index']) == (count, last_row_index):
+        return profile
+
+    query = {'dataset_id': {'$eq': dataset}, 'row_index': {'$lte': last_row_index}}
+    if profile is not None and profile['last_row_index'] is not None:
+        df = await get_dataframe_from_mongo({**query, 'row_index': {'$gt': profile['last_row_index'], '$lte': last_row_index}})
+        if profile['rows'] + len(df) != count:
+            # rows were removed or inserted below the last profiled row_index
+            profile = None
+
+    if profile is None or profile['last_row_index'] is None:
+        profile = new_profile(dataset)
+        df = await get_dataframe_from_mongo(query)
+
+    profile = await run_analysis(update_profile, profile, df)
+    profile['last_row_index'] = last_row_index
+    await _save_profile(collection, profile)
+    return profile
+
+async def _load_profile(collection, dataset):
+    documents = await collection.find({'dataset_id': dataset, 'column': {'$exists': True}}, {'_id': 0}).sort('position', 1).to_list(None)
+    if not documents:
+        return None
+    versions = {(document['dataset_rows'], document['last_row_index']) for document in documents}
+    if len(versions) != 1 or [document['position'] for document in documents] != list(range(len(documents))):
+        # an interrupted save left columns of different refreshes
+        return None
+    rows, last_row_index = versions.pop()
+    return {
+        'dataset_id': dataset,
+        'rows': rows,
+        'last_row_index': last_row_index,
+        'columns': [document['state'] for document in documents],
+    }
+
+async def _save_profile(collection, profile):
+    dataset = profile['dataset_id']
+    columns = [state['column'] for state in profile['columns']]
+    if profile['columns']:
+        await collection.bulk_write([
+            ReplaceOne({'dataset_id': dataset, 'column': state['column']}, {
+                'dataset_id': dataset,
+                'column': state['column'],
+                'position': position,
+                'dataset_rows': profile['rows'],
+                'last_row_index': profile['last_row_index'],
+                'state': state,
+            }, upsert=True)
+            for position, state in enumerate(profile['columns'])
+        ], ordered=False)
+    # columns no longer in the dataset, and profiles stored as a single document
+    await collection.delete_many({'dataset_id': dataset, 'column': {'$nin': columns}})
+
+def update_profile(profile, df):
+    states = {state['column']: state for state in profile['columns']}
+    for col in df.columns:
+        if col not in states:
+            states[col] = _new_column_state(col, profile['rows'])
+            profile['columns'].append(states[col])
+
+    for state in profile['columns']:
+        if state['column'] in df.columns:
+            _update_column_state(state, df[state['column']])
+        else:
+            state['rows'] += len(df)
+            state['missing'] += len(df)
+
+    profile['rows'] += len(df)
+    return profile
+
+def summarise_profile(profile, replace_missing_values=False):
+    """Return ``[(column, (metadata_key, summary) or None)]`` in column order.
+
+    ``None`` marks a column the profile can not answer exactly enough (e.g. an
+    overflowed category table); the caller summarises it from the rows.
+    """
+    return [
+        (state['column'], _column_outcome(state, index, profile['rows'], replace_missing_values))
+        for index, state in enumerate(profile['columns'])
+    ]
+
+def _new_column_state(col, rows):
+    return {
+        'column': col,
+        'rows': rows,
+        'missing': rows,
+        'distinct': [],
+        'unsupported': False,
+        'numeric': new_numeric_state(),
+        'date': {
+            'count': 0,
+            'distinct': [],
+            'min': None,
+            'max': None,
+            'sketch': new_sketch(),
+        },
+        'categories': [],
+    }
+
+def _update_column_state(state, raw):
+    missing = raw.isna()
+    present = raw[~missing]
+    state['rows'] += len(raw)
+    state['missing'] += int(missing.sum())
+
+    try:
+        state['distinct'] = _add_distinct(state['distinct'], present)
+        state['categories'] = _add_categories(state['categories'], present)
+    except TypeError:
+        # unhashable values (nested documents/arrays)
+        state['unsupported'] = True
+        return
+
+    numeric = pd.to_numeric(raw, errors='coerce').dropna().to_numpy(dtype=float)
+    update_numeric_state(state['numeric'], numeric)
+
+    dates = pd.to_datetime(raw, format='%Y-%m-%d', errors='coerce').dropna()
+    _update_date(state['date'], dates.to_numpy(dtype='datetime64[ns]').astype('int64'))
+
+def new_numeric_state():
+    return {
+        'count': 0,
+        'distinct': [],
+        'mean': 0.0,
+        'm2': 0.0,
+        'min': None,
+        'max': None,
+        'increasing': True,
+        'last': None,
+        'sketch': new_sketch(),
+    }
+
+def update_numeric_state(numeric, values):
+    if not len(values):
+        return
+
+    numeric['distinct'] = _add_distinct(numeric['distinct'], pd.Series(values))
+
+    count = numeric['count'] + len(values)
+    mean = float(values.mean())
+    delta = mean - numeric['mean']
+    numeric['m2'] += float(((values - mean) ** 2).sum()) + delta ** 2 * numeric['count'] * len(values) / count
+    numeric['mean'] += delta * len(values) / count
+    numeric['count'] = count
+
+    numeric['min'] = float(values.min()) if numeric['min'] is None else min(numeric['min'], float(values.min()))
+    numeric['max'] = float(values.max()) if numeric['max'] is None else max(numeric['max'], float(values.max()))
+
+    if numeric['increasing']:
+        numeric['increasing'] = bool(np.all(np.diff(values) > 0) and (numeric['last'] is None or values[0] > numeric['last']))
+    numeric['last'] = float(values[-1])
+    numeric['sketch'] = sketch_update(numeric['sketch'], values)
+
+def _update_date(date, values):
+    if not len(values):
+        return
+
+    date['distinct'] = _add_distinct(date['distinct'], pd.Series(values))
+    date['count'] += len(values)
+    date['min'] = int(values.min()) if date['min'] is None else min(date['min'], int(values.min()))
+    date['max'] = int(values.max()) if date['max'] is None else max(date['max'], int(values.max()))
+    date['sketch'] = sketch_update(date['sketch'], values)
+
+def _add_distinct(distinct, values, limit=11):
+    # only "more than 10 distinct values" matters for type inference
+    if len(distinct) >= limit:
+        return distinct
+
+    seen = set(distinct)
+    for value in values.drop_duplicates().head(limit).tolist():
+        if len(seen) >= limit:
+            break
+        if value not in seen:
+            seen.add(value)
+            distinct.append(value)
+    return distinct
+
+def _add_categories(categories, values):
+    if categories is None:
+        return None
+
+    table = dict((key, count) for key, count in categories)
+    for key, count in values.value_counts().items():
+        key = key.item() if hasattr(key, 'item') else key
+        table[key] = table.get(key, 0) + int(count)
+
+    if len(table) > PROFILE_MAX_CATEGORIES:
+        return None
+    return [[key, count] for key, count in table.items()]
+
+def column_type(state):
+    numeric, date = state['numeric'], state['date']
+    denominator = state['missing'] if state['missing'] > 0 else 1
+
+    if (numeric['count'] / denominator) > 0.1 and len(numeric['distinct']) > 10:
+        return 'numeric'
+    if (date['count'] / denominator) > 0.1 or len(date['distinct']) > 10:
+        return 'date'
+    if len(state['distinct']) > 10 and numeric['count'] + state['missing'] == state['rows']:
+        # numeric by pd.to_numeric(errors='raise') but summarised on the raw values
+        return None
+    return 'categorical'
+
+def _numeric_distinct(state):
+    # len(pd.to_numeric(column, errors='coerce').unique()), NaN counted once
+    numeric = state['numeric']
+    has_nan = 1 if numeric['count'] < state['rows'] else 0
+    if numeric['increasing']:
+        return numeric['count'] + has_nan
+    if len(numeric['distinct']) <= 10:
+        return len(numeric['distinct']) + has_nan
+    return None
+
+def _identifier(col):
+    return 'unrecognized_format', {
+        "message": f"Structure of {col} is like identifier columns.",
+        "column": col,
+        "type": "identifier",
+    }
+
+def _column_outcome(state, index, rows, replace_missing_values):
+    col = state['column']
+    if col in ['id', '_id']:
+        return _identifier('id' if col == '_id' else col)
+    if state['unsupported']:
+        return None
+
+    d_type = column_type(state)
+    if d_type is None:
+        return None
+
+    if index == 0:
+        distinct = _numeric_distinct(state)
+        if distinct is None:
+            return None
+        if distinct == rows:
+            return _identifier(col)
+
+    try:
+        if d_type == 'numeric':
+            return 'parsed_colums', _numeric_summary(state, replace_missing_values)
+        if d_type == 'date':
+            return 'parsed_colums', _date_summary(state)
+
+        if state['categories'] is None:
+            return None
+        if len(state['categories']) >= rows:
+            return _identifier(col)
+        return 'parsed_colums', _categorical_summary(state)
+    except Exception:
+        return None
+
+def _numeric_summary(state, replace_missing_values):
+    numeric = state['numeric']
+    average = round_float(float(numeric['mean']))
+    missing_values = state['rows'] - numeric['count']
+
+    bin_edges = np.linspace(numeric['min'], numeric['max'], 11)
+    freq_table = sketch_histogram(numeric['sketch'], bin_edges).to_dict()
+    categories = {'keys':[], 'values':[]}
+    for key, value in freq_table.items():
+        if replace_missing_values and ( round_float(key.left) <= average <  round_float(key.right)):
+            value += missing_values
+        categories['keys'].append(f"{ round_float(key.left)} , { round_float(key.right)}")
+        categories['values'].append(int(value))
+
+    var = numeric['m2'] / (numeric['count'] - 1) if numeric['count'] > 1 else float('nan')
+    return {
+        "column": state['column'],
+        "type": 'numeric',
+        "categories": categories,
+        "missing": "replaced" if replace_missing_values else missing_values,
+        "min": round_float(float(numeric['min'])),
+        "max": round_float(float(numeric['max'])),
+        "mean": average,
+        "median": round_float(float(sketch_median(numeric['sketch']))),
+        "var": round_float(var),
+        "std": round_float(sqrt(var)),
+        "exact": {
+            "categories": numeric['sketch']['exact'],
+            "missing": True,
+            "min": True,
+            "max": True,
+            "mean": True,
+            "median": numeric['sketch']['exact'],
+            "var": True,
+            "std": True,
+        },
+    }
+
+def _date_summary(state):
+    date = state['date']
+    _, edges = pd.cut(pd.Series(pd.to_datetime([date['min'], date['max']])), bins=10, retbins=True)
+    sketch = {**date['sketch'], 'means': pd.to_datetime(np.asarray(date['sketch']['means']).astype('int64'))}
+
+    freq_table = sketch_histogram(sketch, edges).to_dict()
+    categories = {'keys':[], 'values':[]}
+    for key, value in freq_table.items():
+        categories['keys'].append(f"{str(key.left).split(' ')[0]} , {str(key.right).split(' ')[0]}")
+        categories['values'].append(int(value))
+
+    return {
+        "column": state['column'],
+        "type": 'date',
+        "categories": categories,
+        "missing": state['rows'] - date['count'],
+        "min": pd.Timestamp(date['min']),
+        "max": pd.Timestamp(date['max']),
+        "exact": {
+            "categories": date['sketch']['exact'],
+            "missing": True,
+            "min": True,
+            "max": True,
+        },
+    }
+
+def _categorical_summary(state):
+    keys = [key for key, count in state['categories']]
+    # a DataFrame column of numbers holding NaN or any float is float64
+    numbers = all(isinstance(key, (int, float)) and not isinstance(key, bool) for key in keys)
+    as_float = numbers and (state['missing'] > 0 or any(isinstance(key, float) for key in keys))
+
+    table = dict()
+    for key, count in state['categories']:
+        key = float(key) if as_float else key
+        table[key] = table.get(key, 0) + count
+
+    categories = {'keys':[], 'values':[]}
+    for key in sorted(table):
+        categories['keys'].append(key)
+        categories['values'].append(int(table[key]))
+
+    return {
+        "column": state['column'],
+        "type": 'categorical',
+        "categories": categories,
+        "missing": state['missing'],
+        "exact": {
+            "categories": True,
+            "missing": True,
+        },
+    }
@@ -0,0 +1,158 @@
+import os
+import json
+import pickle
+import hashlib
+import threading
+import numpy as np
+from collections import OrderedDict
+from dotenv import load_dotenv
+
+
+load_dotenv()
+
+RESULT_CACHE = os.getenv("RESULT_CACHE", "memory")
+RESULT_CACHE_MAX_ENTRIES = int(os.getenv("RESULT_CACHE_MAX_ENTRIES", 1024))
+RESULT_CACHE_DIR = os.getenv("RESULT_CACHE_DIR", "")
+RESULT_CACHE_MAX_BYTES = int(os.getenv("RESULT_CACHE_MAX_BYTES", 256 * 1024 * 1024))
+
+def result_key(kind, dataset, version, params):
+    """Stable key for a chart result; also used as its ETag."""
+    params = {name: None if value is None else str(value) for name, value in params.items()}
+    payload = json.dumps([kind, int(dataset), list(version), params], sort_keys=True, default=str)
+    return hashlib.sha1(payload.encode()).hexdigest()
+
+class MemoryResultCache:
+    """LRU of computed chart results bounded by an entry count and by the
+    estimated bytes of the results."""
+
+    def __init__(self, max_entries, max_bytes):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            if key not in self._entries:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._entries.move_to_end(key)
+            return self._entries[key][0]
+
+    def put(self, key, result):
+        if self.max_entries <= 0:
+            return
+        size = _size(result)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self.bytes -= self._entries[key][1]
+            self._entries[key] = (result, size)
+            self._entries.move_to_end(key)
+            self.bytes += size
+            while len(self._entries) > self.max_entries or self.bytes > self.max_bytes:
+                _, (_, evicted) = self._entries.popitem(last=False)
+                self.bytes -= evicted
+
+    def stats(self):
+        return {
+            'backend': 'memory',
+            'entries': len(self._entries),
+            'max_entries': self.max_entries,
+            'bytes': self.bytes,
+            'max_bytes': self.max_bytes,
+            'hits': self.hits,
+            'misses': self.misses,
+        }
+
+def _size(value):
+    # what a result holds: array buffers, string lengths and a word per scalar or slot
+    if isinstance(value, np.ndarray) and value.dtype != object:
+        return value.nbytes
+    if isinstance(value, dict):
+        return sum(_size(key) + _size(item) for key, item in value.items())
+    if isinstance(value, (list, tuple, np.ndarray)):
+        return 8 * len(value) + sum(_size(item) for item in value)
+    if isinstance(value, (str, bytes)):
+        return len(value)
+    return 8
+
+class FileResultCache:
+    """Pickled chart results in a directory, shared by every worker process.
+
+    The least recently read files are removed while the directory holds
+    more than ``max_bytes``.
+    """
+
+    def __init__(self, directory, max_bytes):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.directory, f'{key}.pkl')
+
+    def get(self, key):
+        try:
+            with open(self._path(key), 'rb') as file:
+                result = pickle.load(file)
+            os.utime(self._path(key))
+        except (FileNotFoundError, EOFError, pickle.UnpicklingError):
+            self.misses += 1
+            return None
+        self.hits += 1
+        return result
+
+    def put(self, key, result):
+        staging = f'{self._path(key)}.{os.getpid()}.{threading.get_ident()}'
+        try:
+            with open(staging, 'wb') as file:
+                pickle.dump(result, file, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(staging, self._path(key))
+        except OSError:
+            return
+        self._evict()
+
+    def _evict(self):
+        files = []
+        for entry in os.listdir(self.directory):
+            if entry.endswith('.pkl'):
+                path = os.path.join(self.directory, entry)
+                try:
+                    files.append((os.path.getmtime(path), os.path.getsize(path), path))
+                except FileNotFoundError:
+                    continue
+
+        total = sum(size for _, size, _ in files)
+        for _, size, path in sorted(files):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+
+    def stats(self):
+        return {
+            'backend': 'file',
+            'directory': self.directory,
+            'max_bytes': self.max_bytes,
+            'hits': self.hits,
+            'misses': self.misses,
+        }
+
+def _result_cache():
+    if RESULT_CACHE == 'file' and RESULT_CACHE_DIR:
+        return FileResultCache(RESULT_CACHE_DIR, RESULT_CACHE_MAX_BYTES)
+    return MemoryResultCache(RESULT_CACHE_MAX_ENTRIES if RESULT_CACHE != 'off' else 0, RESULT_CACHE_MAX_BYTES)
+
+
+result_cache = _result_cache()
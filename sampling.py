@@ -0,0 +1,91 @@
+import os
+import time
+from math import sqrt
+import numpy as np
+import pandas as pd
+from scipy.stats import norm, chi2
+from dotenv import load_dotenv
+from loader import dataset_version, sample_dataframe_from_mongo
+from helpers import round_float
+
+
+load_dotenv()
+
+EXTRACT_SAMPLE_SIZE = int(os.getenv("EXTRACT_SAMPLE_SIZE", 100000))
+EXTRACT_SAMPLE_MIN_VALUES = int(os.getenv("EXTRACT_SAMPLE_MIN_VALUES", 1000))
+EXTRACT_SAMPLE_CONFIDENCE = float(os.getenv("EXTRACT_SAMPLE_CONFIDENCE", 0.95))
+
+# Approximate extract-metadata profiles a uniform random sample of the rows
+# and scales its counts up to the dataset. Every frequency comes with a
+# Wilson score interval and the mean and variance of numeric columns with
+# normal / chi-square intervals, all at EXTRACT_SAMPLE_CONFIDENCE and with
+# the finite population correction. A column the sample can not classify
+# with confidence is left to an exact scan.
+
+def use_sampling(approximate):
+    return str(approximate).lower() in ['true', '1']
+
+async def sample_dataset(dataset, sample_size=None, time_budget=None, version=None):
+    """Return ``(sample, rows)``; ``sample`` is ``None`` when the dataset is no
+    larger than the sample would be."""
+    dataset = int(dataset)
+    sample_size = EXTRACT_SAMPLE_SIZE if sample_size is None else int(sample_size)
+    version = version if version is not None else await dataset_version(dataset)
+    rows, _ = version
+    if rows <= sample_size:
+        return None, rows
+
+    deadline = time.monotonic() + float(time_budget) if time_budget is not None else None
+    return await sample_dataframe_from_mongo(dataset, sample_size, version, deadline), rows
+
+def approximate_outcome(outcome, raw, sample_rows, rows, confidence=EXTRACT_SAMPLE_CONFIDENCE):
+    """Scale the ``(metadata_key, summary)`` of a sampled column to ``rows``.
+
+    Returns ``None`` when the column needs an exact scan: too few values in
+    the sample, or a verdict (identifier, unparseable) that a sample can not
+    establish.
+    """
+    key, summary = outcome
+    if key != 'parsed_colums':
+        return None
+
+    d_type = summary['type']
+    if d_type == 'numeric':
+        values = pd.to_numeric(raw, errors='coerce').dropna().to_numpy(dtype=float)
+    elif d_type == 'date':
+        values = pd.to_datetime(raw, format='%Y-%m-%d', errors='coerce').dropna()
+    else:
+        values = raw.dropna()
+    if len(values) < EXTRACT_SAMPLE_MIN_VALUES:
+        return None
+
+    z = norm.ppf(0.5 + confidence / 2)
+    summary = dict(summary, sampled=True, sample_size=sample_rows, confidence=confidence)
+
+    counts = summary['categories']['values']
+    estimates = [_estimate(count, sample_rows, rows, z) for count in counts]
+    summary['categories'] = dict(summary['categories'], values=[estimate for estimate, _ in estimates], intervals=[interval for _, interval in estimates])
+    if isinstance(summary['missing'], int):
+        summary['missing'], summary['missing_interval'] = _estimate(summary['missing'], sample_rows, rows, z)
+
+    if d_type == 'numeric' and len(values) > 1:
+        n = len(values)
+        mean, var = float(values.mean()), float(values.var(ddof=1))
+        half = z * sqrt(var / n * (rows - sample_rows) / (rows - 1))
+        summary['mean_interval'] = [round_float(mean - half), round_float(mean + half)]
+        summary['var_interval'] = [
+            round_float((n - 1) * var / chi2.ppf(0.5 + confidence / 2, n - 1)),
+            round_float((n - 1) * var / chi2.ppf(0.5 - confidence / 2, n - 1)),
+        ]
+    return key, summary
+
+def _estimate(count, sample_rows, rows, z):
+    # Wilson score interval of the share count / sample_rows, scaled to rows; the
+    # finite population correction enters as a larger effective sample size
+    p = count / sample_rows
+    n = sample_rows * (rows - 1) / (rows - sample_rows)
+    denominator = 1 + z * z / n
+    centre = (p + z * z / (2 * n)) / denominator
+    half = z * sqrt(p * (1 - p) / n + z * z / (4 * n * n)) / denominator
+    low, high = max(0.0, centre - half), min(1.0, centre + half)
+    return int(round(p * rows)), [int(np.floor(low * rows)), int(np.ceil(high * rows))]
@@ -0,0 +1,28 @@
+import orjson
+import numpy as np
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from metrics import timed
+
+
+# Chart results carry their series as NumPy arrays; orjson writes those
+# straight from the buffer instead of FastAPI walking every element through
+# jsonable_encoder. Anything orjson does not know (pandas timestamps, sets,
+# ...) still goes through jsonable_encoder. Object arrays, which hold
+# Python ints and floats side by side, are written as lists.
+
+OPTIONS = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+
+@timed('serialize')
+def render(content):
+    return orjson.dumps(content, default=_default, option=OPTIONS)
+
+def _default(value):
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    return jsonable_encoder(value)
+
+class FastJSONResponse(JSONResponse):
+
+    def render(self, content):
+        return render(content)
@@ -0,0 +1,56 @@
+import os
+import asyncio
+from dotenv import load_dotenv
+
+
+load_dotenv()
+
+SINGLE_FLIGHT = os.getenv("SINGLE_FLIGHT", "true").lower() == "true"
+
+class SingleFlight:
+    """Deduplicates concurrent calls by key.
+
+    While a call for a key is in flight, further calls with the same key
+    await its result instead of starting their own. Results are shared, so
+    callers must not mutate them. A caller that is cancelled does not cancel
+    the shared call.
+    """
+
+    def __init__(self):
+        self.calls = 0
+        self.coalesced = 0
+        self._flights = dict()
+
+    async def do(self, key, function, *args):
+        if not SINGLE_FLIGHT:
+            self.calls += 1
+            return await function(*args)
+
+        task = self._flights.get(key)
+        if task is None:
+            self.calls += 1
+            task = asyncio.ensure_future(function(*args))
+            self._flights[key] = task
+            task.add_done_callback(lambda done: self._forget(key, done))
+        else:
+            self.coalesced += 1
+
+        return await asyncio.shield(task)
+
+    def _forget(self, key, task):
+        if self._flights.get(key) is task:
+            del self._flights[key]
+        if not task.cancelled():
+            # retrieved here so an error nobody waits for any more is not logged as unhandled
+            task.exception()
+
+    def stats(self):
+        return {
+            'calls': self.calls,
+            'coalesced': self.coalesced,
+            'in_flight': len(self._flights),
+        }
+
+
+dataset_loads = SingleFlight()
+chart_requests = SingleFlight()
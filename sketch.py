@@ -0,0 +1,67 @@
+import os
+import numpy as np
+import pandas as pd
+from dotenv import load_dotenv
+
+
+load_dotenv()
+
+SKETCH_SIZE = int(os.getenv("SKETCH_SIZE", 256))
+
+# A mergeable quantile sketch: weighted centroids kept sorted by mean. While a
+# sketch holds at most SKETCH_SIZE distinct values it is exact; beyond that,
+# neighbouring centroids are merged into roughly equal-weight groups.
+
+def new_sketch():
+    return {'means': [], 'weights': [], 'exact': True}
+
+def sketch_update(sketch, values):
+    values = np.asarray(values, dtype=float)
+    values = values[~np.isnan(values)]
+    if not len(values):
+        return sketch
+
+    means, weights = np.unique(values, return_counts=True)
+    return sketch_merge(sketch, {'means': means, 'weights': weights, 'exact': True})
+
+def sketch_merge(left, right):
+    means = np.concatenate([np.asarray(left['means'], dtype=float), np.asarray(right['means'], dtype=float)])
+    weights = np.concatenate([np.asarray(left['weights'], dtype=float), np.asarray(right['weights'], dtype=float)])
+    exact = left['exact'] and right['exact']
+    if not len(means):
+        return new_sketch()
+
+    means, inverse = np.unique(means, return_inverse=True)
+    weights = np.bincount(inverse, weights=weights)
+    if len(means) > SKETCH_SIZE:
+        means, weights = _compress(means, weights, SKETCH_SIZE)
+        exact = False
+
+    return {'means': means.tolist(), 'weights': weights.tolist(), 'exact': exact}
+
+def sketch_median(sketch):
+    means = np.asarray(sketch['means'], dtype=float)
+    weights = np.asarray(sketch['weights'], dtype=float)
+    total = weights.sum()
+    if not total:
+        return np.nan
+
+    # same interpolation as pandas: average the two middle positions
+    ends = np.cumsum(weights)
+    low = means[np.searchsorted(ends, np.floor((total - 1) / 2), side='right')]
+    high = means[np.searchsorted(ends, np.ceil((total - 1) / 2), side='right')]
+    return (low + high) / 2
+
+def sketch_histogram(sketch, edges):
+    # counts per right-closed bin (edges[i], edges[i + 1]], like pd.cut
+    means = pd.Series(sketch['means'])
+    bins = pd.cut(means, bins=edges)
+    return pd.Series(sketch['weights'], dtype=float).groupby(bins, observed=False).sum()
+
+def _compress(means, weights, size):
+    limit = weights.sum() / size
+    groups = np.floor((np.cumsum(weights) - weights) / limit).astype(int)
+    totals = np.bincount(groups, weights=weights)
+    centers = np.bincount(groups, weights=means * weights)
+    keep = totals > 0
+    return centers[keep] / totals[keep], totals[keep]
@@ -0,0 +1,170 @@
+import os
+import json
+import time
+import pickle
+import shutil
+import tempfile
+import numpy as np
+import pandas as pd
+from dotenv import load_dotenv
+
+
+load_dotenv()
+
+SNAPSHOT_DIR = os.getenv("SNAPSHOT_DIR", "")
+SNAPSHOT_MAX_BYTES = int(os.getenv("SNAPSHOT_MAX_BYTES", 4 * 1024 * 1024 * 1024))
+
+STAGING_PREFIX = '.staging-'
+
+# Column kinds on disk:
+#   npy    - numeric/bool columns, one .npy file, loaded memory-mapped
+#   dict   - object columns holding only strings and missing values, int32
+#            codes (.npy, -1 None, -2 NaN) plus the string table (.json)
+#   pickle - any other object column (mixed types, nested documents)
+
+class SnapshotStore:
+    """Columnar per-version copies of datasets on local disk.
+
+    A snapshot lives in ``<directory>/<dataset>/<rows>_<last row_index>/``
+    with a ``manifest.json`` listing its columns. Saving a new version of a
+    dataset drops the versions committed before it, and the least recently
+    loaded snapshots are removed while the store is above ``max_bytes``.
+    """
+
+    def __init__(self, directory, max_bytes):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+
+    def enabled(self):
+        return bool(self.directory) and self.max_bytes > 0
+
+    def _path(self, dataset, version):
+        rows, last_row_index = version
+        return os.path.join(self.directory, str(dataset), f'{rows}_{last_row_index}')
+
+    def load(self, dataset, version, columns=None):
+        path = self._path(dataset, version)
+        try:
+            with open(os.path.join(path, 'manifest.json')) as file:
+                manifest = json.load(file)
+            os.utime(os.path.join(path, 'manifest.json'))
+        except (FileNotFoundError, NotADirectoryError):
+            self.misses += 1
+            return None
+
+        stored = {column['name']: column for column in manifest['columns']}
+        names = list(stored) if columns is None else list(dict.fromkeys(columns))
+        data = dict()
+        for name in names:
+            if name in stored:
+                data[name] = _read_column(path, stored[name])
+            else:
+                # same as a projection on a field no document has
+                data[name] = np.full(manifest['rows'], np.nan)
+
+        self.hits += 1
+        return pd.DataFrame(data, index=pd.RangeIndex(manifest['rows']), columns=names, copy=False)
+
+    def save(self, dataset, version, df):
+        path = self._path(dataset, version)
+        if os.path.exists(path):
+            return
+
+        parent = os.path.dirname(path)
+        os.makedirs(parent, exist_ok=True)
+        started = time.time()
+        staging = tempfile.mkdtemp(dir=parent, prefix=STAGING_PREFIX)
+        try:
+            manifest = {'rows': len(df), 'columns': [_write_column(staging, index, name, df[name]) for index, name in enumerate(df.columns)]}
+            with open(os.path.join(staging, 'manifest.json'), 'w') as file:
+                json.dump(manifest, file)
+            os.rename(staging, path)
+        except OSError:
+            # another writer got there first, or the disk is full
+            shutil.rmtree(staging, ignore_errors=True)
+            return
+
+        # drop the versions committed before this save began; staging directories
+        # and snapshots committed meanwhile belong to other writers
+        for entry in os.listdir(parent):
+            manifest = os.path.join(parent, entry, 'manifest.json')
+            if entry.startswith(STAGING_PREFIX) or os.path.join(parent, entry) == path:
+                continue
+            try:
+                if os.path.getmtime(manifest) < started:
+                    shutil.rmtree(os.path.join(parent, entry), ignore_errors=True)
+            except OSError:
+                pass
+        self._evict()
+
+    def _evict(self):
+        snapshots = []
+        for dataset in os.listdir(self.directory):
+            if not os.path.isdir(os.path.join(self.directory, dataset)):
+                continue
+            for version in os.listdir(os.path.join(self.directory, dataset)):
+                path = os.path.join(self.directory, dataset, version)
+                manifest = os.path.join(path, 'manifest.json')
+                if os.path.exists(manifest):
+                    snapshots.append((os.path.getmtime(manifest), _size(path), path))
+
+        total = sum(size for _, size, _ in snapshots)
+        for _, size, path in sorted(snapshots):
+            if total <= self.max_bytes:
+                break
+            shutil.rmtree(path, ignore_errors=True)
+            total -= size
+            if not os.listdir(os.path.dirname(path)):
+                os.rmdir(os.path.dirname(path))
+
+    def stats(self):
+        return {
+            'directory': self.directory,
+            'max_bytes': self.max_bytes,
+            'hits': self.hits,
+            'misses': self.misses,
+        }
+
+def _write_column(directory, index, name, column):
+    values = column.to_numpy()
+    if values.dtype != object:
+        np.save(os.path.join(directory, f'{index}.npy'), values)
+        return {'name': name, 'kind': 'npy', 'file': f'{index}.npy'}
+
+    missing = column.isna().to_numpy()
+    present = values[~missing]
+    if all(type(value) is str for value in present):
+        codes, strings = pd.factorize(present)
+        all_codes = np.full(len(values), -1, dtype=np.int32)
+        all_codes[~missing] = codes
+        all_codes[missing & np.array([value is not None for value in values], dtype=bool)] = -2
+        np.save(os.path.join(directory, f'{index}.npy'), all_codes)
+        with open(os.path.join(directory, f'{index}.json'), 'w') as file:
+            json.dump(list(strings), file)
+        return {'name': name, 'kind': 'dict', 'file': f'{index}.npy', 'table': f'{index}.json'}
+
+    with open(os.path.join(directory, f'{index}.pkl'), 'wb') as file:
+        pickle.dump(values, file, protocol=pickle.HIGHEST_PROTOCOL)
+    return {'name': name, 'kind': 'pickle', 'file': f'{index}.pkl'}
+
+def _read_column(directory, column):
+    if column['kind'] == 'npy':
+        return np.load(os.path.join(directory, column['file']), mmap_mode='r')
+
+    if column['kind'] == 'dict':
+        codes = np.load(os.path.join(directory, column['file']), mmap_mode='r')
+        with open(os.path.join(directory, column['table'])) as file:
+            table = np.array(json.load(file) + [np.nan, None], dtype=object)
+        # code -1 indexes None and -2 NaN at the end of the table
+        return table[codes]
+
+    with open(os.path.join(directory, column['file']), 'rb') as file:
+        return pickle.load(file)
+
+def _size(path):
+    return sum(os.path.getsize(os.path.join(path, entry)) for entry in os.listdir(path))
+
+
+snapshot_store = SnapshotStore(SNAPSHOT_DIR, SNAPSHOT_MAX_BYTES)
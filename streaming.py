@@ -0,0 +1,159 @@
+import os
+from math import sqrt
+import numpy as np
+import pandas as pd
+from dotenv import load_dotenv
+from loader import iter_dataframes, get_dataset_version
+from profiles import new_profile, update_profile, column_type, new_numeric_state, update_numeric_state
+from aggregation import CHART_EXECUTION, NUMERIC_STATISTICS, cut_edges
+from helpers import round_float, density_curve
+from workers import run_analysis
+from sketch import new_sketch, sketch_update, sketch_median
+from metrics import timed
+
+
+load_dotenv()
+
+STREAMING_ROW_THRESHOLD = int(os.getenv("STREAMING_ROW_THRESHOLD", 0))
+
+# Bounded-memory execution: the cursor is consumed in STREAM_BATCH_SIZE row
+# DataFrames that are folded into incremental aggregators, so no more than
+# one batch of rows is held at a time. Each fold runs through run_analysis,
+# so the event loop only awaits the cursor.
+
+async def use_streaming(execution, dataset, version=None):
+    execution = execution or CHART_EXECUTION
+    if execution == 'stream':
+        return True
+    if execution != 'pandas' or STREAMING_ROW_THRESHOLD <= 0:
+        return False
+
+    rows, _ = version if version is not None else await get_dataset_version(int(dataset))
+    return rows > STREAMING_ROW_THRESHOLD
+
+@timed('stream')
+async def stream_profile(dataset):
+    profile = new_profile(int(dataset))
+    async for batch in iter_dataframes({'dataset_id': {'$eq': int(dataset)}}):
+        profile = await run_analysis(update_profile, profile, batch)
+    return profile
+
+@timed('stream')
+async def stream_bins(dataset, independent_variable, category_variable=None, density=False):
+    """Two-pass, batch-at-a-time version of the histogram/bar binning.
+
+    The first pass infers the column type and its range, the second bins the
+    rows and folds them into per bin/category counts, moments and quantile
+    sketches. Returns the same dict as ``aggregate_bins_in_mongo`` plus
+    ``exact`` flags and, with ``density``, the density curves.
+    """
+    query = {'dataset_id': {'$eq': int(dataset)}}
+
+    profile = new_profile(int(dataset))
+    async for batch in iter_dataframes(query, [independent_variable]):
+        profile = await run_analysis(update_profile, profile, batch)
+    if not profile['columns']:
+        return None
+
+    state = profile['columns'][0]
+    d_type = column_type(state) or 'numeric'
+    numeric = d_type != 'categorical'
+    if numeric and state['numeric']['count'] == 0:
+        return None
+
+    edges, intervals = None, None
+    if numeric:
+        edges, intervals = cut_edges(state['numeric']['min'], state['numeric']['max'])
+
+    bins = {'cells': dict(), 'overall': new_numeric_state(), 'category_sketches': dict()}
+    columns = [col for col in [independent_variable, category_variable] if col is not None]
+    async for batch in iter_dataframes(query, columns):
+        bins = await run_analysis(_fold_bins, bins, batch, independent_variable, category_variable, edges, density)
+    return await run_analysis(_finish_bins, bins, d_type, category_variable, intervals, density)
+
+def _fold_bins(bins, batch, independent_variable, category_variable=None, edges=None, density=False):
+    numeric = edges is not None
+    keys = ['$$bins', '$$category_variable'] if category_variable is not None else ['$$bins']
+    cells = bins['cells']
+
+    frame = pd.DataFrame({'$$independent_variable': batch[independent_variable]})
+    if category_variable is not None:
+        frame['$$category_variable'] = batch[category_variable]
+
+    if numeric:
+        frame['$$independent_variable'] = pd.to_numeric(frame['$$independent_variable'], errors='coerce')
+        frame['$$bins'] = pd.cut(frame['$$independent_variable'], bins=edges, labels=False)
+    else:
+        frame['$$bins'] = frame['$$independent_variable']
+    frame = frame.dropna()
+
+    if not numeric:
+        for key, count in frame.groupby(keys).size().items():
+            key = key if isinstance(key, tuple) else (key,)
+            cells[key] = cells.get(key, 0) + int(count)
+        bins['overall']['count'] += len(frame)
+        return bins
+
+    for key, values in frame.groupby(keys)['$$independent_variable']:
+        update_numeric_state(cells.setdefault(key, new_numeric_state()), values.to_numpy(dtype=float))
+    update_numeric_state(bins['overall'], frame['$$independent_variable'].to_numpy(dtype=float))
+
+    if density and category_variable is not None:
+        category_sketches = bins['category_sketches']
+        for cat, values in frame.groupby('$$category_variable')['$$independent_variable']:
+            category_sketches[cat] = sketch_update(category_sketches.get(cat, new_sketch()), values.to_numpy(dtype=float))
+    return bins
+
+def _finish_bins(bins, d_type, category_variable=None, intervals=None, density=False):
+    numeric = intervals is not None
+    keys = ['$$bins', '$$category_variable'] if category_variable is not None else ['$$bins']
+    cells, overall, category_sketches = bins['cells'], bins['overall'], bins['category_sketches']
+
+    rows = []
+    for key, cell in cells.items():
+        row = {'$$bins': intervals[int(key[0])] if numeric else key[0]}
+        if category_variable is not None:
+            row['$$category_variable'] = key[1]
+        row.update(_statistics(cell) if numeric else {'count': cell})
+        rows.append(row)
+
+    statistics = NUMERIC_STATISTICS if numeric else ['count']
+    groups = pd.DataFrame(rows, columns=keys + statistics)
+
+    overall_statitis = _statistics(overall) if numeric else {'count': overall['count']}
+    for key, value in overall_statitis.items():
+        overall_statitis[key] = round_float(value)
+
+    exact = {statistic: True for statistic in statistics}
+    if numeric:
+        exact['median'] = overall['sketch']['exact'] and all(cell['sketch']['exact'] for cell in cells.values())
+
+    density_curves = []
+    if density and numeric:
+        exact['density_curve'] = False
+        sketches = category_sketches.items() if category_variable is not None else [(None, overall['sketch'])]
+        for cat, sketch in sorted(sketches, key=lambda item: str(item[0])):
+            d_curve = density_curve(sketch['means'], cat, weights=sketch['weights'])
+            if d_curve is not None:
+                density_curves.append(d_curve)
+
+    return {
+        'd_type': d_type,
+        'overall_statitis': overall_statitis,
+        'groups': groups,
+        'x_axis': sorted(set(groups['$$bins'])),
+        'exact': exact,
+        'density_curve': density_curves,
+    }
+
+def _statistics(numeric):
+    var = numeric['m2'] / (numeric['count'] - 1) if numeric['count'] > 1 else np.nan
+    return {
+        'count': numeric['count'],
+        'std': sqrt(var) if var == var else np.nan,
+        'var': var,
+        'median': sketch_median(numeric['sketch']),
+        'min': numeric['min'],
+        'max': numeric['max'],
+        'mean': numeric['mean'] if numeric['count'] else np.nan,
+    }
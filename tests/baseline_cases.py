@@ -0,0 +1,30 @@
+# The charts checked against the outputs of the original analyser, on
+# make_dataset(ROWS, COLUMNS) stored as DATASET_ID. Each case is
+# (function name, positional arguments after the dataset id).
+
+DATASET_ID = 1
+ROWS = 200
+COLUMNS = 8
+
+CASES = [('extract', []), ('extract', [True])]
+CASES += [
+    ('line', ['numeric_0', 'integer_0', None]),
+    ('line', ['integer_0', 'numeric_0', 'categorical_0']),
+    ('line', ['numeric_0', 'mixed_0', None]),
+]
+CASES += [
+    ('histogram', [x, category, statistic])
+    # the original histogram could not bin date columns
+    for x in ['numeric_0', 'integer_0', 'categorical_0', 'mixed_0']
+    for category in [None, 'categorical_0']
+    for statistic in ['frequency', 'percent', 'density']
+]
+CASES += [
+    ('bar', [x, category, statistic])
+    for x in ['numeric_0', 'integer_0', 'categorical_0']
+    for category in [None, 'categorical_0']
+    for statistic in ['frequency', 'percent'] + (['mean', 'median'] if x != 'categorical_0' else [])
+]
+
+def case_name(function, args):
+    return f"{function}({', '.join(repr(arg) for arg in args)})"
@@ -0,0 +1,41 @@
+"""Write tests/baseline.json from a checkout of the original analyser.
+
+    git worktree add /tmp/baseline <first commit>
+    python tests/make_baseline.py /tmp/baseline
+
+The original analyser reads Mongo through a blocking MongoClient; it is
+pointed at the benchmark stand-in, whose cursors also iterate
+synchronously. Results go through FastAPI's encoder as its endpoints did.
+"""
+import os
+import sys
+import json
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [sys.argv[1], ROOT]
+
+from fastapi.encoders import jsonable_encoder
+from benchmarks.fake_mongo import FakeClient
+from benchmarks.synthetic import make_dataset
+from baseline_cases import DATASET_ID, ROWS, COLUMNS, CASES, case_name
+import analyser
+
+
+def main():
+    client = FakeClient()
+    client.add(DATASET_ID, make_dataset(ROWS, COLUMNS))
+    analyser.MongoClient = lambda uri: client
+
+    outputs = dict()
+    for function, args in CASES:
+        try:
+            outputs[case_name(function, args)] = jsonable_encoder(getattr(analyser, function)(DATASET_ID, *args))
+        except Exception as e:
+            print(f'skipped {case_name(function, args)}: {e!r}')
+
+    with open(os.path.join(ROOT, 'tests', 'baseline.json'), 'w') as file:
+        json.dump(outputs, file, sort_keys=True)
+
+
+if __name__ == '__main__':
+    main()
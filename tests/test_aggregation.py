@@ -0,0 +1,48 @@
+import json
+import asyncio
+import numpy as np
+import pytest
+from bson.decimal128 import Decimal128
+import mongo
+import analyser
+from aggregation import aggregate_bins_in_mongo
+from serialization import render
+from benchmarks.fake_mongo import FakeClient
+from benchmarks.synthetic import make_dataset
+
+
+NUMERIC_DATASET = 41
+DECIMAL_DATASET = 42
+
+@pytest.fixture(scope='module')
+def client():
+    client = FakeClient()
+    client.add(NUMERIC_DATASET, make_dataset(500))
+    dataset = make_dataset(200)
+    values, missing = dataset['numeric_0']
+    # every third value stored as Decimal128, the rest as doubles
+    values = np.array([Decimal128(str(value)) if index % 3 == 0 else value for index, value in enumerate(values)], dtype=object)
+    dataset['numeric_0'] = (values, missing)
+    client.add(DECIMAL_DATASET, dataset)
+    mongo._client = client
+    yield client
+    mongo._client = None
+
+def _chart(function, dataset, *args, **kwargs):
+    result = json.loads(render(asyncio.run(getattr(analyser, function)(dataset, *args, **kwargs))))
+    result.pop('exact', None)
+    return result
+
+@pytest.mark.parametrize('function, statistic', [('histogram', 'frequency'), ('histogram', 'percent'), ('bar', 'frequency'), ('bar', 'mean')])
+@pytest.mark.parametrize('category', [None, 'categorical_0'])
+def test_pushdown_matches_pandas(client, function, statistic, category):
+    expected = _chart(function, NUMERIC_DATASET, 'numeric_0', category, statistic)
+    result = _chart(function, NUMERIC_DATASET, 'numeric_0', category, statistic, execution='mongo')
+
+    # $median is approximate; everything else, the xAxis labels included, is not
+    del expected['statistics']['overall_statitis']['median'], result['statistics']['overall_statitis']['median']
+    assert result == expected
+
+def test_decimal128_columns_take_the_pandas_path(client):
+    assert asyncio.run(aggregate_bins_in_mongo(DECIMAL_DATASET, 'numeric_0')) is None
+    assert _chart('histogram', DECIMAL_DATASET, 'numeric_0', None, 'frequency', execution='mongo') == _chart('histogram', DECIMAL_DATASET, 'numeric_0', None, 'frequency')
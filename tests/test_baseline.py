@@ -0,0 +1,46 @@
+import os
+import json
+import asyncio
+import pytest
+import mongo
+import analyser
+from serialization import render
+from benchmarks.fake_mongo import FakeClient
+from benchmarks.synthetic import make_dataset
+from baseline_cases import DATASET_ID, ROWS, COLUMNS, CASES, case_name
+
+
+# The pandas paths must answer exactly as the original analyser did:
+# tests/baseline.json holds its outputs (see tests/make_baseline.py), and
+# the charts are built here on the same synthetic dataset through the
+# benchmark stand-in for Mongo.
+
+with open(os.path.join(os.path.dirname(__file__), 'baseline.json')) as file:
+    BASELINE = json.load(file)
+
+@pytest.fixture(scope='module')
+def client():
+    client = FakeClient()
+    client.add(DATASET_ID, make_dataset(ROWS, COLUMNS))
+    mongo._client = client
+    yield client
+    mongo._client = None
+
+@pytest.mark.parametrize('function, args', CASES, ids=[case_name(function, args) for function, args in CASES])
+def test_matches_baseline(client, function, args):
+    result = asyncio.run(getattr(analyser, function)(DATASET_ID, *args))
+    _assert_same(json.loads(render(result)), BASELINE[case_name(function, args)])
+
+def _assert_same(value, expected, path='$'):
+    # == alone would let 48.0 stand for 48
+    assert type(value) is type(expected), f'{path}: {value!r} != {expected!r}'
+    if isinstance(expected, dict):
+        assert value.keys() == expected.keys(), f'{path}: keys {sorted(value)} != {sorted(expected)}'
+        for key in expected:
+            _assert_same(value[key], expected[key], f'{path}.{key}')
+    elif isinstance(expected, list):
+        assert len(value) == len(expected), f'{path}: {len(value)} items != {len(expected)}'
+        for index, (item, expected_item) in enumerate(zip(value, expected)):
+            _assert_same(item, expected_item, f'{path}[{index}]')
+    else:
+        assert value == expected, f'{path}: {value!r} != {expected!r}'
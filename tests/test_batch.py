@@ -0,0 +1,40 @@
+import json
+import asyncio
+import pytest
+from fastapi.testclient import TestClient
+import mongo
+import analyser
+from main import app
+from serialization import render
+from benchmarks.fake_mongo import FakeClient
+from benchmarks.synthetic import make_dataset
+
+
+DATASET_ID = 61
+
+@pytest.fixture(scope='module')
+def client():
+    client = FakeClient()
+    client.add(DATASET_ID, make_dataset(300))
+    mongo._client = client
+    yield client
+    mongo._client = None
+
+def test_malformed_specs_fail_on_their_own(client):
+    charts = [
+        {'type': 'histogram', 'independent_variable': 'numeric_0', 'statistic': 'percent'},
+        'histogram',
+        {'type': 'bar', 'independent_variable': ['numeric_0']},
+        {'type': 'bar', 'independent_variable': 'integer_0', 'category_variable': 3},
+    ]
+    results = json.loads(render(asyncio.run(analyser.batch(DATASET_ID, charts))))['charts']
+
+    assert results[0] == json.loads(render(asyncio.run(analyser.histogram(DATASET_ID, 'numeric_0', None, 'percent'))))
+    assert results[1]['type'] is None and 'must be an object' in results[1]['error']
+    assert results[2]['type'] == 'bar' and 'must be a column name' in results[2]['error']
+    assert results[3]['type'] == 'bar' and 'category_variable' in results[3]['error']
+
+def test_the_endpoint_rejects_a_body_without_a_list(client):
+    response = TestClient(app).post(f'/dataset/batch/{DATASET_ID}', json={'charts': {'type': 'bar'}})
+
+    assert response.status_code == 422
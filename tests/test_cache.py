@@ -0,0 +1,50 @@
+import numpy as np
+import pandas as pd
+from cache import DatasetCache
+
+
+def _frame(rows=1000, columns=('a', 'b')):
+    return pd.DataFrame({col: np.arange(rows, dtype=float) for col in columns})
+
+def _size(df):
+    return int(df.memory_usage(index=True, deep=True).sum())
+
+def test_the_least_recently_used_dataset_is_evicted_past_the_budget():
+    cache = DatasetCache(max_bytes=2 * _size(_frame()), ttl=60)
+    cache.put(1, (1000, 999), _frame(), complete=True)
+    cache.put(2, (1000, 999), _frame(), complete=True)
+    assert cache.get(1, (1000, 999)) is not None
+
+    cache.put(3, (1000, 999), _frame(), complete=True)
+
+    assert cache.get(2, (1000, 999)) is None
+    assert cache.get(1, (1000, 999)) is not None and cache.get(3, (1000, 999)) is not None
+    assert cache.stats()['evictions'] == 1
+    assert cache.bytes == 2 * _size(_frame()) <= cache.max_bytes
+
+def test_a_frame_larger_than_the_budget_is_not_cached():
+    cache = DatasetCache(max_bytes=_size(_frame()) - 1, ttl=60)
+    cache.put(1, (1000, 999), _frame(), complete=True)
+
+    assert cache.get(1, (1000, 999)) is None
+    assert cache.bytes == 0
+
+def test_a_new_version_or_an_expired_entry_is_dropped():
+    cache = DatasetCache(max_bytes=2 ** 30, ttl=60)
+    cache.put(1, (1000, 999), _frame(), complete=True)
+    assert cache.get(1, (1001, 1000)) is None
+    assert cache.get(1, (1000, 999)) is None and cache.bytes == 0
+
+    cache = DatasetCache(max_bytes=2 ** 30, ttl=-1)
+    cache.put(1, (1000, 999), _frame(), complete=True)
+    assert cache.get(1, (1000, 999)) is None and cache.bytes == 0
+
+def test_projected_loads_of_one_version_are_merged():
+    cache = DatasetCache(max_bytes=2 ** 30, ttl=60)
+    cache.put(1, (1000, 999), _frame(columns=['a']))
+    cache.put(1, (1000, 999), _frame(columns=['b']))
+
+    assert list(cache.get(1, (1000, 999), ['b', 'a']).columns) == ['b', 'a']
+    assert cache.get(1, (1000, 999), ['a', 'c']) is None
+    assert cache.get(1, (1000, 999)) is None
+    assert cache.bytes == _size(_frame())
@@ -0,0 +1,46 @@
+import json
+import asyncio
+import numpy as np
+import pytest
+import mongo
+import analyser
+from downsampling import lttb
+from serialization import render
+from benchmarks.fake_mongo import FakeClient
+from benchmarks.synthetic import make_dataset
+
+
+DATASET_ID = 101
+
+@pytest.fixture
+def client(monkeypatch):
+    client = FakeClient()
+    client.add(DATASET_ID, make_dataset(300))
+    monkeypatch.setattr(mongo, '_client', client)
+    monkeypatch.setattr(analyser, 'LINE_MAX_POINTS', 20)
+    return client
+
+def _points(result):
+    return json.loads(render(result))['series'][0]['data']
+
+def test_lttb_keeps_the_ends_and_the_peaks():
+    x = np.arange(1000, dtype=float)
+    y = np.sin(x / 50)
+    y[500] = 10
+
+    keep = lttb(x, y, 50)
+
+    assert len(keep) == 50 and keep[0] == 0 and keep[-1] == 999
+    assert 500 in keep
+    assert list(keep) == sorted(keep)
+
+def test_only_line_charts_are_downsampled(client):
+    line = _points(asyncio.run(analyser.line(DATASET_ID, 'numeric_0', 'integer_0')))
+    scatter = _points(asyncio.run(analyser.scatter(DATASET_ID, 'numeric_0', 'integer_0')))
+    charts = json.loads(render(asyncio.run(analyser.batch(DATASET_ID, [
+        {'type': 'line', 'independent_variable': 'numeric_0', 'dependent_variable': 'integer_0'},
+        {'type': 'scatter', 'independent_variable': 'numeric_0', 'dependent_variable': 'integer_0'},
+    ]))))['charts']
+
+    assert len(line) == 20 and len(charts[0]['series'][0]['data']) == 20
+    assert len(scatter) > 250 and charts[1]['series'][0]['data'] == scatter
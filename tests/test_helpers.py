@@ -0,0 +1,49 @@
+import numpy as np
+import pytest
+from scipy.stats import gaussian_kde
+from kde import kde, KDE_EXACT_MAX_ROWS
+from helpers import round_float, round_floats, round_array
+
+
+def test_round_floats_keeps_values_beyond_int64_as_floats():
+    rounded = round_floats([1e300, -1e300, 2.0 ** 63, 2.0 ** 62, 48.0])
+
+    assert [type(value) for value in rounded] == [float, float, float, int, int]
+    assert rounded[0] == 1e300 and rounded[1] == -1e300 and rounded[3] == 2 ** 62
+
+def test_round_floats_matches_round_float():
+    values = np.random.default_rng(0).normal(0, 5000, 2000).round(3)
+    values[::7] = np.trunc(values[::7])
+    values[::11] = np.nan
+
+    # round_float of a Python float rounds the exact binary value, of a NumPy float the scaled one
+    assert list(round_floats(values, exact=True)) == [round_float(float(value)) for value in values]
+    assert list(round_floats(values)) == [round_float(value) for value in values]
+
+def test_round_array_keeps_each_value_type():
+    assert round_array([1.0, 2.0]).dtype == np.int64
+    assert round_array([1.5, 2.25]).dtype == np.float64
+    assert [type(value) for value in round_array([48.0, -658.414, 1e300])] == [int, float, float]
+
+@pytest.mark.parametrize('bw_method', [None, 'silverman', 0.05])
+def test_binned_kde_stays_within_one_percent_of_the_peak(bw_method):
+    rng = np.random.default_rng(0)
+    data = np.concatenate([rng.normal(0, 1, 30000), rng.normal(6, 0.5, 10000)])
+    points = np.linspace(data.min(), data.max(), 100)
+    assert len(data) > KDE_EXACT_MAX_ROWS
+
+    exact = gaussian_kde(data, bw_method=bw_method)(points)
+    binned = kde(data, points, bw_method=bw_method)
+
+    assert np.max(np.abs(binned - exact)) <= 0.01 * exact.max()
+
+def test_binned_kde_weighs_values_like_gaussian_kde():
+    rng = np.random.default_rng(1)
+    data = rng.normal(0, 1, 20000)
+    weights = rng.integers(1, 5, 20000).astype(float)
+    points = np.linspace(data.min(), data.max(), 100)
+
+    exact = gaussian_kde(data, weights=weights)(points)
+    binned = kde(data, points, weights)
+
+    assert np.max(np.abs(binned - exact)) <= 0.01 * exact.max()
@@ -0,0 +1,62 @@
+import asyncio
+import pandas as pd
+import pytest
+import mongo
+import analyser
+from analyser import _numeric_distinct
+from inference import infer_column
+from cache import dataset_cache
+from benchmarks.fake_mongo import FakeClient
+from benchmarks.synthetic import make_dataset
+
+
+DATASET_ID = 111
+
+@pytest.fixture
+def inferences(monkeypatch):
+    client = FakeClient()
+    client.add(DATASET_ID, make_dataset(300))
+    monkeypatch.setattr(mongo, '_client', client)
+    monkeypatch.setattr(dataset_cache, 'max_bytes', 2 ** 30)
+    dataset_cache.invalidate(DATASET_ID)
+
+    calls = []
+    def counted(column, *args, **kwargs):
+        calls.append(len(column))
+        return infer_column(column, *args, **kwargs)
+    monkeypatch.setattr(analyser, 'infer_column', counted)
+    client.inferred = calls
+    yield client
+    dataset_cache.invalidate(DATASET_ID)
+
+
+def _dates(rows):
+    days = pd.date_range('2020-01-01', periods=rows, freq='D').strftime('%Y-%m-%d')
+    return pd.Series(days, dtype=object).where(pd.Series(range(rows)) % 7 != 0, None)
+
+def test_sampled_date_verdict_has_numeric_distinct():
+    column = _dates(500)
+    inferred = infer_column(column, sample_size=50)
+
+    assert inferred['type'] == 'date'
+    assert inferred['numeric_distinct'] is None
+    assert _numeric_distinct(pd.DataFrame({'joined': column}), 'joined', inferred) == 1
+
+def test_sampled_verdict_matches_full_inference():
+    for column in [_dates(500), pd.Series([float(i % 40) for i in range(500)]), pd.Series(['a', 'b', None] * 100, dtype=object)]:
+        sampled = infer_column(column, sample_size=50)
+        full = infer_column(column, sample_size=0)
+
+        assert sampled['type'] == full['type']
+        pd.testing.assert_series_equal(sampled['parsed'], full['parsed'])
+
+def test_a_column_is_inferred_once_per_dataset_version(inferences):
+    asyncio.run(analyser.histogram(DATASET_ID, 'numeric_0', None, 'frequency', 'pandas'))
+    asyncio.run(analyser.bar(DATASET_ID, 'numeric_0', 'categorical_0', 'frequency', 'pandas'))
+    asyncio.run(analyser.extract(DATASET_ID))
+    # every column but the id once: the extract reuses the charts' numeric_0 and categorical_0
+    assert len(inferences.inferred) == len(make_dataset(300)) - 1
+
+    inferences.add(DATASET_ID, make_dataset(320))
+    asyncio.run(analyser.histogram(DATASET_ID, 'numeric_0', None, 'frequency', 'pandas'))
+    assert inferences.inferred[-1] == 320 and inferences.inferred.count(320) == 1
@@ -0,0 +1,65 @@
+import asyncio
+import pytest
+import mongo
+import loader
+from cache import dataset_cache
+from snapshots import snapshot_store
+from benchmarks.fake_mongo import FakeClient, FakeCollection
+from benchmarks.synthetic import make_dataset
+
+
+DATASET_ID = 71
+
+@pytest.fixture
+def client(monkeypatch):
+    client = FakeClient()
+    client.add(DATASET_ID, make_dataset(100))
+    mongo._client = client
+    monkeypatch.setattr(loader, '_counts', dict())
+
+    counts = []
+    count_documents = FakeCollection.count_documents
+    async def counted(self, query=None):
+        counts.append(query)
+        return await count_documents(self, query)
+    monkeypatch.setattr(FakeCollection, 'count_documents', counted)
+    client.counts = counts
+    yield client
+    mongo._client = None
+
+def test_version_counts_rows_only_when_the_last_row_moves(client):
+    assert asyncio.run(loader.get_dataset_version(DATASET_ID)) == (100, 99)
+    assert asyncio.run(loader.get_dataset_version(DATASET_ID)) == (100, 99)
+    assert len(client.counts) == 1
+
+    client.add(DATASET_ID, make_dataset(120))
+    assert asyncio.run(loader.get_dataset_version(DATASET_ID)) == (120, 119)
+    assert len(client.counts) == 2
+
+def test_version_recounts_after_the_interval(client, monkeypatch):
+    monkeypatch.setattr(loader, 'VERSION_RECOUNT_INTERVAL', 0)
+    asyncio.run(loader.get_dataset_version(DATASET_ID))
+    asyncio.run(loader.get_dataset_version(DATASET_ID))
+
+    assert len(client.counts) == 2
+
+def test_a_projected_load_fetches_only_its_columns(client, monkeypatch):
+    projections = []
+    find = FakeCollection.find
+    def spied(self, query=None, projection=None):
+        if projection is None or 'row_index' not in projection:
+            projections.append(projection)
+        return find(self, query, projection)
+    monkeypatch.setattr(FakeCollection, 'find', spied)
+    monkeypatch.setattr(snapshot_store, 'directory', '')
+    dataset_cache.invalidate(DATASET_ID)
+
+    df, _ = asyncio.run(loader.load_dataset(DATASET_ID, ['numeric_0', 'absent', 'numeric_0']))
+    dataset_cache.invalidate(DATASET_ID)
+    full, _ = asyncio.run(loader.load_dataset(DATASET_ID))
+    dataset_cache.invalidate(DATASET_ID)
+
+    assert projections == [{'data.numeric_0': 1, 'data.absent': 1, '_id': 0}, None]
+    assert list(df.columns) == ['numeric_0', 'absent']
+    assert df['absent'].isna().all()
+    assert df['numeric_0'].equals(full['numeric_0'])
@@ -0,0 +1,53 @@
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+import mongo
+import loader
+from main import app
+from results import MemoryResultCache, result_cache
+from benchmarks.fake_mongo import FakeClient
+from benchmarks.synthetic import make_dataset
+
+
+DATASET_ID = 141
+
+@pytest.fixture
+def client(monkeypatch):
+    client = FakeClient()
+    client.add(DATASET_ID, make_dataset(200))
+    monkeypatch.setattr(mongo, '_client', client)
+    monkeypatch.setattr(loader, '_counts', dict())
+    return client
+
+def _get(headers=None):
+    params = {'independent_variable': 'numeric_0', 'statistic': 'frequency', 'execution': 'pandas'}
+    return TestClient(app).get(f'/dataset/histogram-chart/{DATASET_ID}', params=params, headers=headers or {})
+
+def test_a_revalidation_with_the_etag_gets_a_304_until_the_dataset_changes(client):
+    first = _get()
+    etag = first.headers['ETag']
+    hits = result_cache.stats()['hits']
+
+    assert _get().content == first.content
+    assert result_cache.stats()['hits'] == hits + 1
+
+    revalidated = _get({'If-None-Match': f'W/{etag}, "other"'})
+    assert revalidated.status_code == 304 and revalidated.content == b''
+    assert revalidated.headers['ETag'] == etag
+
+    client.add(DATASET_ID, make_dataset(220))
+    changed = _get({'If-None-Match': etag})
+    assert changed.status_code == 200 and changed.headers['ETag'] != etag
+    assert changed.json() != first.json()
+
+def test_the_result_cache_stays_within_its_byte_budget():
+    result = {'series': [{'data': np.arange(100, dtype=float)}]}
+    cache = MemoryResultCache(max_entries=100, max_bytes=2000)
+    for key in range(5):
+        cache.put(key, result)
+
+    assert cache.bytes <= cache.max_bytes
+    assert [cache.get(key) is not None for key in range(5)] == [False, False, False, True, True]
+
+    cache.put('large', {'data': np.arange(1000, dtype=float)})
+    assert cache.get('large') is None
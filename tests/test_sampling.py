@@ -0,0 +1,55 @@
+import json
+import asyncio
+import numpy as np
+import pytest
+import mongo
+import analyser
+from serialization import render
+from sampling import EXTRACT_SAMPLE_CONFIDENCE
+from benchmarks.fake_mongo import FakeClient
+from benchmarks.synthetic import make_dataset
+
+
+DATASET_ID = 161
+
+@pytest.fixture
+def client(monkeypatch):
+    client = FakeClient()
+    client.add(DATASET_ID, make_dataset(20000))
+    monkeypatch.setattr(mongo, '_client', client)
+
+    # the samples are drawn from unseeded generators; seed them in turn so the test is repeatable
+    seeds = iter(range(10 ** 6))
+    default_rng = np.random.default_rng
+    monkeypatch.setattr(np.random, 'default_rng', lambda seed=None: default_rng(next(seeds) if seed is None else seed))
+    return client
+
+def _extract(**kwargs):
+    return json.loads(render(asyncio.run(analyser.extract(DATASET_ID, **kwargs))))['parsed_colums']
+
+def test_sampled_intervals_cover_the_exact_counts(client):
+    exact = {summary['column']: summary for summary in _extract()}
+    covered = []
+    for _ in range(10):
+        for summary in _extract(approximate='true', sample_size=3000):
+            truth = exact[summary['column']]
+            assert summary['type'] == truth['type']
+            if not summary.get('sampled'):
+                assert summary == truth
+                continue
+            bounds = [(summary['missing'], summary['missing_interval'], truth['missing'])]
+            if summary['type'] == 'categorical':
+                counts = dict(zip(truth['categories']['keys'], truth['categories']['values']))
+                bounds += [
+                    (estimate, interval, counts[key])
+                    for key, estimate, interval in zip(summary['categories']['keys'], summary['categories']['values'], summary['categories']['intervals'])
+                ]
+            for estimate, (low, high), count in bounds:
+                assert 0 <= low <= estimate <= high <= 20000
+                covered.append(low <= count <= high)
+
+    assert len(covered) > 200
+    assert np.mean(covered) >= EXTRACT_SAMPLE_CONFIDENCE - 0.03
+
+def test_a_dataset_no_larger_than_the_sample_is_profiled_exactly(client):
+    assert _extract(approximate='true', sample_size=20000) == _extract()
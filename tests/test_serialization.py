@@ -0,0 +1,52 @@
+import json
+import asyncio
+import numpy as np
+import pandas as pd
+import pytest
+import mongo
+import analyser
+from serialization import render
+from benchmarks.fake_mongo import FakeClient
+from benchmarks.synthetic import make_dataset
+
+
+DATASET_ID = 151
+
+@pytest.fixture(scope='module')
+def client():
+    client = FakeClient()
+    client.add(DATASET_ID, make_dataset(200))
+    mongo._client = client
+    yield client
+    mongo._client = None
+
+def test_render_writes_what_the_json_module_would():
+    content = {
+        'floats': np.array([1.5, -0.25, 1e300]),
+        'ints': np.array([1, 2, 3], dtype=np.int64),
+        'mixed': np.array([48, -658.41], dtype=object),
+        'pairs': np.column_stack([np.array([1, 2]), np.array([3, 4])]),
+        'keys': {1: 'one'},
+        'when': pd.Timestamp('2020-01-02'),
+    }
+    expected = {
+        'floats': [1.5, -0.25, 1e300],
+        'ints': [1, 2, 3],
+        'mixed': [48, -658.41],
+        'pairs': [[1, 3], [2, 4]],
+        'keys': {'1': 'one'},
+        'when': '2020-01-02T00:00:00',
+    }
+
+    assert json.loads(render(content)) == expected
+    assert [type(value) for value in json.loads(render(content))['mixed']] == [int, float]
+
+@pytest.mark.parametrize('x, y', [('numeric_0', 'integer_0'), ('integer_0', 'numeric_0')])
+def test_the_columns_layout_holds_the_pairs_points(client, x, y):
+    pairs = json.loads(render(asyncio.run(analyser.line(DATASET_ID, x, y, layout='pairs'))))
+    columns = json.loads(render(asyncio.run(analyser.line(DATASET_ID, x, y, layout='columns'))))
+
+    points = pairs['series'][0]['data']
+    assert columns['series'][0]['data'] == {'x': [point[0] for point in points], 'y': [point[1] for point in points]}
+    integers = 0 if x == 'integer_0' else 1
+    assert all(type(point[integers]) is int for point in points)
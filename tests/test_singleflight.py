@@ -0,0 +1,80 @@
+import asyncio
+import pytest
+import mongo
+import loader
+from cache import dataset_cache
+from singleflight import SingleFlight
+from benchmarks.fake_mongo import FakeClient
+from benchmarks.synthetic import make_dataset
+
+
+DATASET_ID = 131
+
+def test_concurrent_calls_with_one_key_share_a_call():
+    flight = SingleFlight()
+    calls = []
+    async def load(key):
+        calls.append(key)
+        await asyncio.sleep(0.01)
+        return [key]
+
+    async def run():
+        return await asyncio.gather(*[flight.do(key, load, key) for key in ['a', 'a', 'b', 'a']])
+
+    results = asyncio.run(run())
+
+    assert calls == ['a', 'b']
+    assert results == [['a'], ['a'], ['b'], ['a']] and results[0] is results[1]
+    assert flight.stats() == {'calls': 2, 'coalesced': 2, 'in_flight': 0}
+
+def test_an_error_reaches_every_caller_and_is_not_remembered():
+    flight = SingleFlight()
+    async def fail():
+        await asyncio.sleep(0.01)
+        raise ValueError('lost')
+
+    async def run():
+        return await asyncio.gather(flight.do('a', fail), flight.do('a', fail), return_exceptions=True)
+
+    assert [str(error) for error in asyncio.run(run())] == ['lost', 'lost']
+    with pytest.raises(ValueError):
+        asyncio.run(flight.do('a', fail))
+    assert flight.stats()['calls'] == 2
+
+def test_a_cancelled_caller_leaves_the_call_to_the_others():
+    flight = SingleFlight()
+    async def load():
+        await asyncio.sleep(0.05)
+        return 'loaded'
+
+    async def run():
+        first = asyncio.ensure_future(flight.do('a', load))
+        second = asyncio.ensure_future(flight.do('a', load))
+        await asyncio.sleep(0.01)
+        first.cancel()
+        return await second
+
+    assert asyncio.run(run()) == 'loaded'
+
+def test_concurrent_loads_of_a_dataset_scan_it_once(monkeypatch):
+    client = FakeClient()
+    client.add(DATASET_ID, make_dataset(100))
+    monkeypatch.setattr(mongo, '_client', client)
+    dataset_cache.invalidate(DATASET_ID)
+    scans = []
+    get_dataframe_from_mongo = loader.get_dataframe_from_mongo
+    async def slow(query={}, columns=None):
+        # the fake cursor never yields; a server round trip would
+        scans.append(columns)
+        await asyncio.sleep(0.01)
+        return await get_dataframe_from_mongo(query, columns)
+    monkeypatch.setattr(loader, 'get_dataframe_from_mongo', slow)
+
+    async def run():
+        return await asyncio.gather(*[loader.load_dataset(DATASET_ID, ['numeric_0']) for _ in range(4)])
+
+    frames = [df for df, _ in asyncio.run(run())]
+    dataset_cache.invalidate(DATASET_ID)
+
+    assert len(scans) == 1
+    assert all(df['numeric_0'].equals(frames[0]['numeric_0']) for df in frames)
@@ -0,0 +1,58 @@
+import os
+import asyncio
+import numpy as np
+import pandas as pd
+import pytest
+import mongo
+import loader
+from cache import dataset_cache
+from snapshots import SnapshotStore, snapshot_store
+from benchmarks.fake_mongo import FakeClient
+from benchmarks.synthetic import make_dataset
+
+
+DATASET_ID = 91
+
+def _frame():
+    return pd.DataFrame({
+        'number': [1.5, np.nan, 3.0],
+        'text': ['a', None, np.nan],
+        'mixed': ['a', 2, None],
+    })
+
+def test_snapshots_load_what_was_saved(tmp_path):
+    store = SnapshotStore(str(tmp_path), 2 ** 30)
+    store.save(DATASET_ID, (3, 2), _frame())
+
+    loaded = store.load(DATASET_ID, (3, 2))
+    pd.testing.assert_frame_equal(loaded, _frame())
+    assert list(store.load(DATASET_ID, (3, 2), ['mixed', 'absent']).columns) == ['mixed', 'absent']
+    assert store.load(DATASET_ID, (4, 3)) is None
+
+def test_a_save_leaves_staging_directories_alone(tmp_path):
+    store = SnapshotStore(str(tmp_path), 2 ** 30)
+    store.save(DATASET_ID, (3, 2), _frame())
+    staging = tmp_path / str(DATASET_ID) / '.staging-another-writer'
+    staging.mkdir()
+    (staging / '0.npy').write_bytes(b'partial')
+
+    store.save(DATASET_ID, (4, 3), pd.concat([_frame(), _frame().iloc[:1]], ignore_index=True))
+
+    assert sorted(os.listdir(tmp_path / str(DATASET_ID))) == ['.staging-another-writer', '4_3']
+    assert (staging / '0.npy').read_bytes() == b'partial'
+
+def test_loaded_columns_stay_memory_mapped(tmp_path, monkeypatch):
+    client = FakeClient()
+    client.add(DATASET_ID, make_dataset(100))
+    monkeypatch.setattr(mongo, '_client', client)
+    monkeypatch.setattr(snapshot_store, 'directory', str(tmp_path))
+    dataset_cache.invalidate(DATASET_ID)
+
+    asyncio.run(loader.load_dataset(DATASET_ID))
+    dataset_cache.invalidate(DATASET_ID)
+    # from the snapshot, then from the dataset cache holding it
+    for _ in range(2):
+        df, _ = asyncio.run(loader.load_dataset(DATASET_ID, ['numeric_0', 'integer_0']))
+        assert not df['numeric_0'].to_numpy().flags.writeable
+        assert not df['integer_0'].to_numpy().flags.writeable
+    dataset_cache.invalidate(DATASET_ID)
@@ -0,0 +1,39 @@
+import json
+import asyncio
+import pytest
+from functools import partial
+import mongo
+import analyser
+import streaming
+from loader import iter_dataframes
+from serialization import render
+from benchmarks.fake_mongo import FakeClient
+from benchmarks.synthetic import make_dataset
+
+
+DATASET_ID = 51
+
+@pytest.fixture(scope='module')
+def client():
+    client = FakeClient()
+    client.add(DATASET_ID, make_dataset(500))
+    mongo._client = client
+    yield client
+    mongo._client = None
+
+def _chart(function, *args, **kwargs):
+    result = json.loads(render(asyncio.run(getattr(analyser, function)(DATASET_ID, *args, **kwargs))))
+    result.pop('exact', None)
+    return result
+
+@pytest.mark.parametrize('function, statistic', [('histogram', 'frequency'), ('histogram', 'percent'), ('bar', 'frequency'), ('bar', 'mean')])
+@pytest.mark.parametrize('category', [None, 'categorical_0'])
+def test_stream_matches_pandas(client, monkeypatch, function, statistic, category):
+    # several batches, so the folds merge partial states
+    monkeypatch.setattr(streaming, 'iter_dataframes', partial(iter_dataframes, batch_size=120))
+    expected = _chart(function, 'numeric_0', category, statistic)
+    result = _chart(function, 'numeric_0', category, statistic, execution='stream')
+
+    # the streamed median comes from a sketch; everything else, the xAxis labels included, is exact
+    del expected['statistics']['overall_statitis']['median'], result['statistics']['overall_statitis']['median']
+    assert result == expected
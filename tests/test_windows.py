@@ -0,0 +1,72 @@
+import json
+import asyncio
+import warnings
+import numpy as np
+import pandas as pd
+import pytest
+from bson.decimal128 import Decimal128
+import mongo
+import analyser
+import windows
+from serialization import render
+from Exceptions import InvalidCursorException
+from benchmarks.fake_mongo import FakeClient
+from benchmarks.synthetic import make_dataset
+
+
+DATASET_ID = 81
+DECIMAL_DATASET = 82
+
+@pytest.fixture(scope='module')
+def client():
+    client = FakeClient()
+    client.add(DATASET_ID, make_dataset(400))
+    dataset = make_dataset(200)
+    values, missing = dataset['numeric_0']
+    values = np.array([Decimal128(str(value)) if index % 4 == 0 else value for index, value in enumerate(values)], dtype=object)
+    dataset['numeric_0'] = (values, missing)
+    client.add(DECIMAL_DATASET, dataset)
+    mongo._client = client
+    yield client
+    mongo._client = None
+
+def _line(dataset, x, y, **kwargs):
+    return json.loads(render(asyncio.run(analyser.line(dataset, x, y, **kwargs))))
+
+def _pages(dataset, x, y, limit, **kwargs):
+    points, after = [], None
+    while True:
+        page = _line(dataset, x, y, limit=limit, after=after, **kwargs)
+        points += page['series'][0]['data']
+        assert len(page['series'][0]['data']) <= limit
+        after = page['next']
+        if after is None:
+            return points
+
+def _bound(points, share):
+    # midway between two rounded x values far enough apart for no raw value to round across it
+    xs = sorted(set(point[0] for point in points))
+    index = next(index for index in range(int(len(xs) * share), len(xs) - 1) if xs[index + 1] - xs[index] > 0.02)
+    return (xs[index] + xs[index + 1]) / 2
+
+@pytest.mark.parametrize('x, numbers', [('numeric_0', True), ('integer_0', True), ('mixed_0', False), ('categorical_0', False)])
+def test_fields_stored_as_numbers_are_windowed_in_mongo(client, x, numbers):
+    assert asyncio.run(windows._stored_as_numbers(DATASET_ID, (400, 399), x)) is numbers
+
+@pytest.mark.parametrize('dataset, x, y', [(DATASET_ID, 'numeric_0', 'integer_0'), (DATASET_ID, 'mixed_0', 'numeric_0'), (DECIMAL_DATASET, 'numeric_0', 'integer_0')])
+def test_pages_cover_the_window_once_in_order(client, dataset, x, y):
+    whole = _line(dataset, x, y)['series'][0]['data']
+    low, high = _bound(whole, 0.2), _bound(whole, 0.8)
+
+    with warnings.catch_warnings():
+        warnings.simplefilter('error', pd.errors.SettingWithCopyWarning)
+        window = _line(dataset, x, y, x_min=low, x_max=high)['series'][0]['data']
+        pages = _pages(dataset, x, y, 37, x_min=low, x_max=high)
+
+    assert pages == window
+    assert sorted(map(tuple, window)) == sorted(tuple(point) for point in whole if low <= point[0] <= high)
+    assert [point[0] for point in window] == sorted(point[0] for point in window)
+
+def test_density_scatter_rejects_paging(client):
+    with pytest.raises(InvalidCursorException):
+        asyncio.run(analyser.scatter(DATASET_ID, 'numeric_0', 'integer_0', mode='density', limit=10))
@@ -0,0 +1,92 @@
+import json
+import asyncio
+import threading
+import pytest
+from fastapi.testclient import TestClient
+import mongo
+import loader
+import workers
+import analyser
+from main import app
+from serialization import render
+from Exceptions import AnalysisBusyException, AnalysisTimeoutException
+from benchmarks.fake_mongo import FakeClient
+from benchmarks.synthetic import make_dataset
+
+
+DATASET_ID = 121
+WIDE_DATASET = 122
+
+@pytest.fixture
+def pool(monkeypatch):
+    monkeypatch.setattr(workers, 'ANALYSIS_EXECUTOR', 'thread')
+    monkeypatch.setattr(workers, 'ANALYSIS_QUEUE_SIZE', 1)
+    monkeypatch.setattr(workers, 'EXTRACT_WORKERS', 1)
+    workers.shutdown()
+    yield
+    workers.shutdown()
+
+def test_analyses_beyond_the_queue_are_refused(pool):
+    async def run():
+        release = threading.Event()
+        first = asyncio.ensure_future(workers.run_analysis(release.wait))
+        await asyncio.sleep(0)
+        with pytest.raises(AnalysisBusyException):
+            await workers.run_analysis(sum, [1])
+        release.set()
+        assert await first is True
+        assert await workers.run_analysis(sum, [1, 2]) == 3
+
+    asyncio.run(run())
+    assert workers.stats()['pending'] == 0
+
+def test_a_timed_out_analysis_holds_its_slot_until_it_finishes(pool, monkeypatch):
+    monkeypatch.setattr(workers, 'ANALYSIS_TIMEOUT', 0.05)
+    release = threading.Event()
+
+    with pytest.raises(AnalysisTimeoutException):
+        asyncio.run(workers.run_analysis(release.wait))
+    assert workers.stats()['pending'] == 1
+
+    release.set()
+    # the worker releases the slot before its thread exits
+    workers._executor.shutdown(wait=True)
+    assert workers.stats()['pending'] == 0
+
+def test_a_busy_pool_answers_429(pool, monkeypatch):
+    client = FakeClient()
+    client.add(DATASET_ID, make_dataset(100))
+    monkeypatch.setattr(mongo, '_client', client)
+    monkeypatch.setattr(workers, 'ANALYSIS_QUEUE_SIZE', 0)
+
+    response = TestClient(app).get(f'/dataset/histogram-chart/{DATASET_ID}', params={'independent_variable': 'numeric_0', 'execution': 'pandas'})
+
+    assert response.status_code == 429
+    assert response.headers['Retry-After'] == str(workers.ANALYSIS_RETRY_AFTER)
+
+def test_columns_profiled_in_parallel_match_a_serial_extract(monkeypatch):
+    client = FakeClient()
+    client.add(WIDE_DATASET, make_dataset(500, columns=41))
+    monkeypatch.setattr(mongo, '_client', client)
+    df, _ = asyncio.run(loader.load_dataset(WIDE_DATASET))
+
+    workers.shutdown()
+    serial = render(analyser._summarise_frame(df))
+
+    monkeypatch.setattr(workers, 'EXTRACT_WORKERS', 2)
+    monkeypatch.setattr(analyser, 'EXTRACT_WORKERS', 2)
+    monkeypatch.setattr(analyser, 'EXTRACT_PARALLEL_MIN_COLUMNS', 2)
+    chunks = []
+    map_columns = workers.map_columns
+    def spied(function, df, parts, *args):
+        chunks.extend(parts)
+        return map_columns(function, df, parts, *args)
+    monkeypatch.setattr(analyser, 'map_columns', spied)
+    try:
+        workers.start()
+        parallel = render(analyser._summarise_frame(df))
+    finally:
+        workers.shutdown()
+
+    assert len(chunks) > 1
+    assert json.loads(parallel) == json.loads(serial)
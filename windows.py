@@ -0,0 +1,120 @@
+import json
+import base64
+import numpy as np
+import pandas as pd
+from collections import OrderedDict
+from bson.decimal128 import Decimal128
+from loader import dataset_version, load_dataset, get_window_from_mongo
+from mongo import get_collection
+from aggregation import NUMERIC_TYPES
+from indexes import index_manager
+from workers import run_analysis
+from Exceptions import InvalidCursorException
+
+
+# Windowed line/scatter requests read only the rows with x_min <= x <= x_max,
+# ordered by (x, row order) and cut into pages of ``limit`` rows. When the x
+# field is stored as BSON numbers the window is a range query on
+# (dataset_id, data.<x>, row_index); otherwise (numeric strings, ...) it is
+# cut from the cached frame. A page cursor records which of the two produced
+# it, with the x and row key of the page's last row.
+
+_numeric_fields = OrderedDict()
+NUMERIC_FIELDS_MEMO_SIZE = 1024
+
+def windowed(x_min=None, x_max=None, limit=None, after=None):
+    return any(value is not None for value in [x_min, x_max, limit, after])
+
+async def load_window(dataset, independent_variable, columns, x_min=None, x_max=None, limit=None, after=None, version=None):
+    """Return ``(df, next_cursor)``; ``df`` holds ``independent_variable`` and
+    ``columns`` for the window's rows in order, ``next_cursor`` is ``None`` on
+    the last page."""
+    dataset = int(dataset)
+    x_min = None if x_min is None else float(x_min)
+    x_max = None if x_max is None else float(x_max)
+    limit = None if limit is None else int(limit)
+    if limit is not None and limit < 1:
+        raise InvalidCursorException('limit must be at least 1')
+    cursor = decode_cursor(after)
+    columns = [col for col in columns if col is not None]
+
+    index_manager.note(independent_variable)
+    if version is None:
+        version = await dataset_version(dataset)
+    if cursor is not None:
+        in_mongo = cursor['by'] == 'row_index'
+    else:
+        in_mongo = await _stored_as_numbers(dataset, version, independent_variable)
+
+    if in_mongo:
+        return await _window_from_mongo(dataset, independent_variable, columns, x_min, x_max, limit, cursor)
+
+    df, version = await load_dataset(dataset, [independent_variable] + columns, version)
+    return await run_analysis(_window_from_frame, df, independent_variable, x_min, x_max, limit, cursor)
+
+async def _window_from_mongo(dataset, independent_variable, columns, x_min, x_max, limit, cursor):
+    field = f'data.{independent_variable}'
+    # $gte -inf keeps exactly the numbers (not NaN, null or other types) and can use the index;
+    # Decimal128, no JSON number for the cursor, is left out as pd.to_numeric leaves it out
+    bounds = {'$gte': float('-inf') if x_min is None else x_min, '$type': NUMERIC_TYPES}
+    if x_max is not None:
+        bounds['$lte'] = x_max
+    query = {'dataset_id': {'$eq': dataset}, field: bounds}
+    if cursor is not None:
+        query['$or'] = [{field: {'$gt': cursor['x']}}, {field: cursor['x'], 'row_index': {'$gt': cursor['key']}}]
+
+    df, last = await get_window_from_mongo(query, columns, independent_variable, limit)
+    return df, None if last is None else encode_cursor('row_index', *last)
+
+def _window_from_frame(df, independent_variable, x_min, x_max, limit, cursor):
+    x = pd.to_numeric(df[independent_variable], errors='coerce').to_numpy(dtype=float)
+    position = np.arange(len(df))
+    keep = ~np.isnan(x)
+    if x_min is not None:
+        keep &= x >= x_min
+    if x_max is not None:
+        keep &= x <= x_max
+    if cursor is not None:
+        keep &= (x > cursor['x']) | ((x == cursor['x']) & (position > cursor['key']))
+
+    selected = position[keep][np.lexsort((position[keep], x[keep]))]
+    next_cursor = None
+    if limit is not None and len(selected) > limit:
+        selected = selected[:limit]
+        next_cursor = encode_cursor('position', float(x[selected[-1]]), int(selected[-1]))
+
+    return df.iloc[selected], next_cursor
+
+async def _stored_as_numbers(dataset, version, independent_variable):
+    key = (dataset, version, independent_variable)
+    if key not in _numeric_fields:
+        # numbers sort before strings and every other non-null BSON type, so
+        # the greatest value, one lookup on the window index, tells whether
+        # anything but numbers and nulls is stored
+        field = f'data.{independent_variable}'
+        greatest = await get_collection().find_one(
+            {'dataset_id': {'$eq': dataset}},
+            {field: 1, '_id': 0},
+            sort=[(field, -1)],
+        )
+        value = (greatest or {}).get('data', {}).get(independent_variable)
+        _numeric_fields[key] = value is None or (isinstance(value, (int, float, Decimal128)) and not isinstance(value, bool))
+        while len(_numeric_fields) > NUMERIC_FIELDS_MEMO_SIZE:
+            _numeric_fields.popitem(last=False)
+    _numeric_fields.move_to_end(key)
+    return _numeric_fields[key]
+
+def encode_cursor(by, x, key):
+    payload = json.dumps({'by': by, 'x': x, 'key': key})
+    return base64.urlsafe_b64encode(payload.encode()).decode()
+
+def decode_cursor(after):
+    if after is None:
+        return None
+    try:
+        cursor = json.loads(base64.urlsafe_b64decode(after.encode()))
+        if cursor['by'] not in ['row_index', 'position'] or not isinstance(cursor['x'], (int, float)) or not isinstance(cursor['key'], int):
+            raise ValueError(cursor)
+    except (ValueError, KeyError, TypeError):
+        raise InvalidCursorException(f'invalid page cursor {after!r}')
+    return cursor
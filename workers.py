@@ -0,0 +1,179 @@
+import os
+import asyncio
+import threading
+import contextvars
+import multiprocessing
+import numpy as np
+import pandas as pd
+from multiprocessing.shared_memory import SharedMemory
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from dotenv import load_dotenv
+from Exceptions import AnalysisBusyException, AnalysisTimeoutException
+from metrics import timed
+
+
+load_dotenv()
+
+ANALYSIS_EXECUTOR = os.getenv("ANALYSIS_EXECUTOR", "thread")
+ANALYSIS_WORKERS = int(os.getenv("ANALYSIS_WORKERS", os.cpu_count() or 1))
+ANALYSIS_QUEUE_SIZE = int(os.getenv("ANALYSIS_QUEUE_SIZE", 4 * ANALYSIS_WORKERS))
+ANALYSIS_TIMEOUT = float(os.getenv("ANALYSIS_TIMEOUT", 30))
+ANALYSIS_RETRY_AFTER = int(os.getenv("ANALYSIS_RETRY_AFTER", 1))
+EXTRACT_WORKERS = int(os.getenv("EXTRACT_WORKERS", os.cpu_count() or 1))
+EXTRACT_PARALLEL_MIN_COLUMNS = int(os.getenv("EXTRACT_PARALLEL_MIN_COLUMNS", 32))
+
+# CPU-bound analysis (parsing, grouping, KDE) is dispatched here so the event
+# loop keeps serving other requests. At most ANALYSIS_QUEUE_SIZE tasks are
+# running or queued at once; beyond that callers get AnalysisBusyException.
+
+_executor = None
+_pending = 0
+_lock = threading.Lock()
+_extract_pool = None
+_extract_lock = threading.Lock()
+
+def start():
+    global _executor
+    with _extract_lock:
+        _start_extract_pool()
+    if _executor is not None or ANALYSIS_EXECUTOR == 'inline':
+        return
+    if ANALYSIS_EXECUTOR == 'process':
+        # spawn: forking a process that runs an event loop and driver threads is unsafe
+        _executor = ProcessPoolExecutor(ANALYSIS_WORKERS, mp_context=multiprocessing.get_context('spawn'))
+    else:
+        _executor = ThreadPoolExecutor(ANALYSIS_WORKERS, thread_name_prefix='analysis')
+
+def shutdown():
+    global _executor, _extract_pool
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+    with _extract_lock:
+        if _extract_pool is not None:
+            _extract_pool.shutdown(wait=False, cancel_futures=True)
+            _extract_pool = None
+
+def stats():
+    return {
+        'executor': ANALYSIS_EXECUTOR,
+        'workers': ANALYSIS_WORKERS,
+        'queue_size': ANALYSIS_QUEUE_SIZE,
+        'pending': _pending,
+        'extract_workers': EXTRACT_WORKERS if _extract_pool is not None else 0,
+    }
+
+@timed('analysis')
+async def run_analysis(function, *args):
+    if ANALYSIS_EXECUTOR == 'inline':
+        return function(*args)
+
+    start()
+    _acquire()
+    try:
+        if ANALYSIS_EXECUTOR == 'process':
+            future = _executor.submit(function, *args)
+        else:
+            # the thread sees the request's context, so stages inside the analysis are timed too
+            future = _executor.submit(contextvars.copy_context().run, function, *args)
+    except Exception:
+        _release()
+        raise
+    # the slot is held until the work itself finishes, not until the caller gives up
+    future.add_done_callback(_release)
+
+    try:
+        return await asyncio.wait_for(asyncio.shield(asyncio.wrap_future(future)), ANALYSIS_TIMEOUT if ANALYSIS_TIMEOUT > 0 else None)
+    except asyncio.TimeoutError:
+        future.cancel()
+        raise AnalysisTimeoutException(f'analysis did not finish within {ANALYSIS_TIMEOUT:g} seconds')
+
+def can_map_columns(tasks):
+    return _extract_pool is not None and len(tasks) > 1
+
+def map_columns(function, df, chunks, *args):
+    """``[function(frame, chunk, *args) for chunk in chunks]`` on the extract
+    pool, where ``chunk`` lists ``(index, column)`` pairs of ``df`` and
+    ``frame`` holds just those columns.
+
+    Fixed-width columns reach the processes through shared memory; any other
+    column is pickled with the one chunk that reads it. The processes are
+    spawned once by start() and never see the parent's caches or locks.
+    """
+    pool = _extract_pool
+    blocks = []
+    futures = []
+    try:
+        for chunk in chunks:
+            frame = {'index': df.index, 'columns': [(col, _share(df[col], blocks)) for _, col in chunk]}
+            futures.append(pool.submit(_call_on_frame, function, frame, chunk, args))
+        # the blocks are unlinked below, so every task must be done with them first
+        wait(futures)
+        return [future.result() for future in futures]
+    except BrokenProcessPool:
+        with _extract_lock:
+            if _extract_pool is pool:
+                _restart_extract_pool()
+        raise
+    finally:
+        for future in futures:
+            future.cancel()
+        wait(futures)
+        for block in blocks:
+            block.close()
+            block.unlink()
+
+def _start_extract_pool():
+    global _extract_pool
+    if _extract_pool is None and EXTRACT_WORKERS > 1:
+        _extract_pool = ProcessPoolExecutor(EXTRACT_WORKERS, mp_context=multiprocessing.get_context('spawn'))
+
+def _restart_extract_pool():
+    global _extract_pool
+    _extract_pool.shutdown(wait=False, cancel_futures=True)
+    _extract_pool = None
+    _start_extract_pool()
+
+def _share(column, blocks):
+    if not isinstance(column.dtype, np.dtype) or column.dtype.kind not in 'biufcmM' or len(column) == 0:
+        return 'pickled', column
+    values = column.to_numpy()
+    block = SharedMemory(create=True, size=values.nbytes)
+    blocks.append(block)
+    np.ndarray(values.shape, values.dtype, buffer=block.buf)[:] = values
+    return 'shared', (block.name, values.dtype.str, len(values))
+
+def _call_on_frame(function, frame, chunk, args):
+    blocks = []
+    data = dict()
+    for col, (kind, payload) in frame['columns']:
+        if kind == 'shared':
+            name, dtype, length = payload
+            blocks.append(SharedMemory(name=name))
+            data[col] = np.ndarray(length, np.dtype(dtype), buffer=blocks[-1].buf)
+        else:
+            data[col] = payload
+    df = pd.DataFrame(data, index=frame['index'], copy=False)
+    try:
+        return function(df, chunk, *args)
+    finally:
+        del df, data
+        for block in blocks:
+            try:
+                block.close()
+            except BufferError:
+                # a result still views the block; it goes when the result is sent
+                pass
+
+def _acquire():
+    global _pending
+    with _lock:
+        if _pending >= ANALYSIS_QUEUE_SIZE:
+            raise AnalysisBusyException('too many analyses in progress, retry later')
+        _pending += 1
+
+def _release(future=None):
+    global _pending
+    with _lock:
+        _pending -= 1